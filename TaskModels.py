@@ -27,12 +27,23 @@ class TaskList(BaseModel):
     task_list: List[Task]
     current_datetime: datetime
 
+class TaskListDelta(BaseModel):
+    is_delta: bool               = Field(True, description="This result only lists changes since the previous identical query in this conversation")
+    previous_call: int           = Field(..., description="How many times this query had already been answered in this conversation")
+    added: List[Task]            = Field(..., description="Tasks that were not in the previous result")
+    changed: List[Task]          = Field(..., description="Tasks from the previous result whose contents changed")
+    removed_task_ids: List[str]  = Field(..., description="IDs of tasks from the previous result that are no longer included")
+    unchanged_count: int         = Field(..., description="Number of tasks identical to the previous result")
+    current_datetime: datetime
+
 class TaskIdModel(BaseModel):
     task_id: str
 
 class TaskUpdateModel(BaseModel):
     task_id: str
     updated: bool
+    queued: bool = Field(False, description="True when the change was queued locally and will reach ClickUp in the background")
+    error: Optional[str] = Field(None, description="Why the change was not applied, when updated is false")
 
 class TaskAddComment(BaseModel):
     task_id: str
@@ -63,11 +74,37 @@ class TaskCreate(BaseModel):
     task_description: str
     
 
-class WeekToDateTasksInput(BaseModel):
+class TaskScope(BaseModel):
+    list_ids: List[str]   = Field([], description="ClickUp list IDs to include")
+    folder_ids: List[str] = Field([], description="ClickUp folder IDs; every list in each folder is included")
+    space_ids: List[str]  = Field([], description="ClickUp space IDs; every list in each space is included")
+    team_wide: bool       = Field(False, description="Query every list in the workspace; the id fields are ignored")
+
+class WeekToDateTasksInput(TaskScope):
     skip_past_due: bool = Field(False, description="Whether to skip past due tasks")    
+    full_refresh: bool  = Field(False, description="Return the full task list instead of only the changes since the last identical call")
 
-class TagIdList(BaseModel):
+class TagIdList(TaskScope):
     tag_ids: List[str]
+    full_refresh: bool  = Field(False, description="Return the full task list instead of only the changes since the last identical call")
+
+class AllTasksInput(TaskScope):
+    full_refresh: bool  = Field(False, description="Return the full task list instead of only the changes since the last identical call")
+
+class TaskSearchInput(TaskScope):
+    query: str          = Field(..., description="Words describing the task, matched against task names, descriptions and tags")
+    k: int              = Field(10, description="Maximum number of matches to return")
+    refresh: bool       = Field(False, description="Re-fetch the lists in scope before searching instead of using the local index")
+
+class TaskSearchHit(BaseModel):
+    score: float
+    task: Task
+
+class TaskSearchResult(BaseModel):
+    query: str
+    hits: List[TaskSearchHit]
+    indexed_tasks: int  = Field(..., description="Number of tasks in the local index that were searched")
+    current_datetime: datetime
 
 
 class NullModel(BaseModel):
@@ -0,0 +1,273 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from singleflight import SingleFlight
+from tracing import tracer
+
+## Shared ClickUp HTTP plumbing. Every direct API call goes through one pooled
+## requests.Session and one rate limiter, so concurrent sessions in the same
+## process share connections and stay under the workspace rate limit together.
+##
+## CLICKUP_API_BASE can point at a local stub server for load testing.
+CLICKUP_API_BASE = os.environ.get("CLICKUP_API_BASE", "https://api.clickup.com/api/v2").rstrip("/")
+REQUEST_TIMEOUT  = float(os.environ.get("CLICKUP_TIMEOUT", "30"))
+FANOUT_WORKERS   = int(os.environ.get("CLICKUP_FANOUT_WORKERS", "8"))
+
+## Set by the caller, the same way clickuphelper is configured
+headers: Dict[str, str] = {}
+
+
+class RateLimiter:
+    """
+    Token bucket limiter. ClickUp allows 100 requests per minute per token on
+    the lower plans, so that is the default refill rate.
+    """
+
+    def __init__(self, per_minute: float = 100, burst: Optional[int] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1, int(per_minute // 6)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause_until(self, epoch_seconds: float):
+        """Drain the bucket so nobody sends again before the server's reset time."""
+        with self.lock:
+            delay = max(0.0, epoch_seconds - time.time())
+            self.tokens = -delay * self.rate
+            self.updated = time.monotonic()
+
+
+rate_limiter = RateLimiter(float(os.environ.get("CLICKUP_RATE_PER_MINUTE", "100")))
+
+## Identical GETs that are in flight at the same time share one request
+inflight = SingleFlight()
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.environ.get("CLICKUP_POOL_SIZE", "32")))
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+
+def api_url(path: str) -> str:
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    return CLICKUP_API_BASE + path
+
+
+def request(method: str, path: str, max_retries: int = 3, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session and rate limiter.
+
+    429 responses are retried after the X-RateLimit-Reset time (or with
+    exponential backoff when the header is missing); the final response is
+    returned as-is so callers can decide how to treat failures.
+    """
+    kwargs.setdefault("headers", headers)
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    url = api_url(path)
+
+    with tracer.span("http.request", method=method, path=path) as span:
+        for attempt in range(max_retries + 1):
+            with tracer.accumulate("rate_limit_wait"):
+                rate_limiter.acquire()
+            resp = session.request(method, url, **kwargs)
+            span.set("status_code", resp.status_code)
+            span.set("attempts", attempt + 1)
+            if resp.status_code != 429 or attempt == max_retries:
+                return resp
+            reset = resp.headers.get("X-RateLimit-Reset")
+            if reset is not None:
+                rate_limiter.pause_until(float(reset))
+            else:
+                time.sleep(min(30, 2 ** attempt))
+        return resp
+
+
+def _request_key(path: str, params: Optional[Dict[str, Any]]) -> Tuple:
+    items = []
+    for k, v in sorted((params or {}).items()):
+        items.append((k, tuple(v) if isinstance(v, (list, tuple)) else v))
+    return (path, tuple(items))
+
+
+def get_json(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    GET a ClickUp endpoint and return the decoded body. Concurrent calls with
+    the same path and params are coalesced into a single HTTP request, and
+    every caller receives the same (read-only) body.
+
+    Raises:
+    requests.RequestException: If the request fails or returns a bad status code.
+    ValueError: If the API response indicates an error.
+    """
+    return inflight.do(_request_key(path, params), lambda: _get_json(path, params))
+
+
+def _get_json(path: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    resp = request("GET", path, params=params)
+    resp.raise_for_status()
+    data = resp.json()
+    if 'err' in data:
+        raise ValueError(f"API Error: {data['err']}")
+    return data
+
+
+def get_task(task_id: str) -> Dict[str, Any]:
+    return get_json(f"/task/{task_id}")
+
+
+def iter_list_task_pages(list_id: str, params: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the raw task dicts of a list one page at a time."""
+    return _iter_task_pages(f"/list/{list_id}/task", params)
+
+
+def iter_team_task_pages(team_id: str, params: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield every task in the workspace matching `params`, one page at a time."""
+    return _iter_task_pages(f"/team/{team_id}/task", params)
+
+
+def _iter_task_pages(path: str, params: Optional[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    page = 0
+    while True:
+        data = get_json(path, params={**(params or {}), "page": page})
+        tasks = data.get("tasks", [])
+        if tasks:
+            yield tasks
+        ## ClickUp pages hold up to 100 tasks; older responses omit last_page
+        if not tasks or data.get("last_page", len(tasks) < 100):
+            return
+        page += 1
+
+
+def get_list_tasks(list_id: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    tasks = []
+    for page in iter_list_task_pages(list_id, params):
+        tasks.extend(page)
+    return tasks
+
+
+def _id_by_name(items: List[Dict[str, Any]], name: str, kind: str) -> str:
+    for item in items:
+        if item["name"] == name:
+            return item["id"]
+    raise KeyError(f"{kind} names are {[item['name'] for item in items]}")
+
+
+def find_list_id(team_id: str, space_name: str, folder_name: Optional[str], list_name: str) -> str:
+    """
+    Look up a list id by space, folder and list name, the same way
+    clickuphelper.get_list_tasks does. Folder name is optional if set to None
+    or an empty string.
+    """
+    archived = {"archived": "false"}
+    space_id = _id_by_name(get_json(f"/team/{team_id}/space", archived)["spaces"], space_name, "Space")
+    if not folder_name:
+        lists = get_json(f"/space/{space_id}/list", archived)["lists"]
+    else:
+        folder_id = _id_by_name(get_json(f"/space/{space_id}/folder", archived)["folders"], folder_name, "Folder")
+        lists = get_json(f"/folder/{folder_id}/list", archived)["lists"]
+    return _id_by_name(lists, list_name, "List")
+
+
+def get_folder_list_ids(folder_id: str) -> List[str]:
+    return [l["id"] for l in get_json(f"/folder/{folder_id}/list").get("lists", [])]
+
+
+def get_space_list_ids(space_id: str) -> List[str]:
+    """Ids of the folderless lists in a space followed by the lists in each of its folders."""
+    list_ids = [l["id"] for l in get_json(f"/space/{space_id}/list").get("lists", [])]
+    for folder in get_json(f"/space/{space_id}/folder").get("folders", []):
+        ## Folder responses normally embed their lists; ask only when they don't
+        if "lists" in folder:
+            list_ids.extend(l["id"] for l in folder["lists"])
+        else:
+            list_ids.extend(get_folder_list_ids(folder["id"]))
+    return list_ids
+
+
+def resolve_list_ids(list_ids: Iterable[str] = (), folder_ids: Iterable[str] = (),
+                     space_ids: Iterable[str] = ()) -> List[str]:
+    """Expand folders and spaces into their list ids, resolving them concurrently."""
+    lookups = [(get_folder_list_ids, f) for f in folder_ids] + [(get_space_list_ids, s) for s in space_ids]
+    resolved = list(list_ids)
+    if lookups:
+        with ThreadPoolExecutor(max_workers=min(FANOUT_WORKERS, len(lookups)),
+                                thread_name_prefix="sbct-fanout") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, fn, arg) for fn, arg in lookups]
+            for future in futures:
+                resolved.extend(future.result())
+    return list(dict.fromkeys(resolved))
+
+
+def iter_lists_task_pages(list_ids: Iterable[str], params: Optional[Dict[str, Any]] = None,
+                          workers: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Page through several lists concurrently and yield each page as soon as it
+    arrives, in no particular order. All requests share the rate limiter, so
+    more workers only help up to the workspace limit. The first error raised
+    by any list is re-raised once the others have stopped.
+    """
+    list_ids = list(dict.fromkeys(list_ids))
+    if len(list_ids) <= 1:
+        for list_id in list_ids:
+            yield from iter_list_task_pages(list_id, params)
+        return
+
+    pages: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    stop = threading.Event()
+
+    def fetch(list_id: str):
+        try:
+            for page in iter_list_task_pages(list_id, params):
+                if stop.is_set():
+                    break
+                pages.put(("page", page))
+        except Exception as e:
+            pages.put(("error", e))
+        finally:
+            pages.put(("done", list_id))
+
+    pool = ThreadPoolExecutor(max_workers=min(workers or FANOUT_WORKERS, len(list_ids)),
+                              thread_name_prefix="sbct-fanout")
+    for list_id in list_ids:
+        ## Run in a copy of this context so request spans nest under the caller's
+        pool.submit(contextvars.copy_context().run, fetch, list_id)
+
+    error = None
+    remaining = len(list_ids)
+    try:
+        while remaining:
+            kind, value = pages.get()
+            if kind == "done":
+                remaining -= 1
+            elif kind == "error":
+                error = error or value
+                stop.set()
+            elif error is None:
+                yield value
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    if error is not None:
+        raise error
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from tracing import tracer
+
+## Model tiering for chatbot_interaction.
+##
+## Every model call is classified by what the response is expected to be:
+##
+##   initial       first call of a turn, answering the user's message
+##   continuation  a tool result was just appended; usually the model only
+##                 reads it and issues the next tool call
+##   fallback      a retry on the main model after the fast one fell short
+##
+## Continuations go to the fast model when SBCT_FAST_MODEL is set. If that
+## call fails, or stops at max_tokens, it is retried on the main model. With
+## SBCT_FAST_FINAL_FALLBACK=1 a final answer written by the fast model is also
+## regenerated by the main model, so the user only ever reads main-model text.
+##
+## SBCT_MAX_TOKENS_INITIAL / _CONTINUATION / _FALLBACK size each kind. The
+## continuation size only applies on the fast tier: without a fast model,
+## continuations often write the final answer, so they get the initial size.
+## SBCT_MODEL_PRICES='{"model-id": [input, output]}' (USD per million tokens)
+## adds to or overrides the built-in prices used for the cost statistics.
+
+DEFAULT_MAX_TOKENS = {
+    "initial": 4096,
+    "continuation": 1024,
+    "fallback": 4096,
+}
+
+## USD per million (input, output) tokens
+DEFAULT_PRICES = {
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": (3.00, 15.00),
+    "claude-3-5-sonnet-20240620": (3.00, 15.00),
+    "anthropic.claude-3-haiku-20240307-v1:0": (0.25, 1.25),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+}
+
+
+class TierStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "errors": self.errors, "fallbacks": self.fallbacks,
+                "mean_latency_ms": 1000 * self.seconds / self.calls if self.calls else 0.0,
+                "input_tokens": self.input_tokens, "output_tokens": self.output_tokens,
+                "cost_usd": round(self.cost, 6)}
+
+
+class RoutingPolicy:
+    """
+    Decides which model and max_tokens each call uses and keeps per-tier
+    latency, token and cost statistics. Without a fast model every call goes
+    to the main model, so the policy only does max_tokens sizing.
+    """
+
+    def __init__(self, main_model: str, fast_model: Optional[str] = None,
+                 max_tokens: Optional[Dict[str, int]] = None,
+                 final_fallback: bool = False,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.main_model = main_model
+        self.fast_model = fast_model or None
+        self.max_tokens = {**DEFAULT_MAX_TOKENS, **(max_tokens or {})}
+        self.final_fallback = final_fallback
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+        self.lock = threading.Lock()
+        self.tiers: Dict[str, TierStats] = {"main": TierStats(), "fast": TierStats()}
+
+    def choose(self, kind: str) -> Tuple[str, str, int]:
+        """Return (tier, model, max_tokens) for a call of the given kind."""
+        if kind == "continuation":
+            if self.fast_model:
+                return "fast", self.fast_model, self.max_tokens[kind]
+            return "main", self.main_model, self.max_tokens["initial"]
+        return "main", self.main_model, self.max_tokens[kind]
+
+    def needs_fallback(self, tier: str, response) -> bool:
+        if tier != "fast":
+            return False
+        if response.stop_reason == "max_tokens":
+            return True
+        return self.final_fallback and response.stop_reason != "tool_use"
+
+    def cost(self, model: str, usage) -> float:
+        if usage is None or model not in self.prices:
+            return 0.0
+        price_in, price_out = self.prices[model]
+        return (usage.input_tokens * price_in + usage.output_tokens * price_out) / 1e6
+
+    def record(self, tier: str, model: str, seconds: float, usage=None,
+               error: bool = False, fell_back: bool = False):
+        with self.lock:
+            stats = self.tiers[tier]
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.errors += int(error)
+            stats.fallbacks += int(fell_back)
+            if usage is not None:
+                stats.input_tokens += usage.input_tokens
+                stats.output_tokens += usage.output_tokens
+                stats.cost += self.cost(model, usage)
+
+    def _create(self, client, kind: str, tier: str, model: str, max_tokens: int, kwargs: Dict[str, Any]):
+        with tracer.span("model.messages.create", model=model, tier=tier, kind=kind,
+                         max_tokens=max_tokens, messages=len(kwargs.get("messages", []))) as span:
+            start = time.perf_counter()
+            try:
+                response = client.messages.create(model=model, max_tokens=max_tokens, **kwargs)
+            except Exception:
+                self.record(tier, model, time.perf_counter() - start, error=True,
+                            fell_back=tier == "fast")
+                raise
+            fell_back = self.needs_fallback(tier, response)
+            usage = getattr(response, "usage", None)
+            self.record(tier, model, time.perf_counter() - start, usage, fell_back=fell_back)
+            span.set("stop_reason", response.stop_reason)
+            span.set("fell_back", fell_back)
+            span.record_usage(usage)
+        return response, fell_back
+
+    def call(self, client, kind: str, **kwargs):
+        """
+        Make one messages.create call of the given kind through `client`,
+        retrying on the main model when the fast tier falls short.
+        Returns (response, tier, model) for the response actually used.
+        """
+        tier, model, max_tokens = self.choose(kind)
+        if tier == "fast":
+            try:
+                response, fell_back = self._create(client, kind, tier, model, max_tokens, kwargs)
+            except Exception:
+                fell_back = True
+            if not fell_back:
+                return response, tier, model
+            tier, model, max_tokens = "main", self.main_model, self.max_tokens["fallback"]
+            kind = "fallback"
+
+        response, _ = self._create(client, kind, tier, model, max_tokens, kwargs)
+        return response, tier, model
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return {tier: s.to_dict() for tier, s in self.tiers.items() if s.calls}
+
+
+def policy_from_env(main_model: str) -> RoutingPolicy:
+    max_tokens = {kind: int(os.environ.get(f"SBCT_MAX_TOKENS_{kind.upper()}", default))
+                  for kind, default in DEFAULT_MAX_TOKENS.items()}
+    prices = {model: tuple(p) for model, p in json.loads(os.environ.get("SBCT_MODEL_PRICES", "{}")).items()}
+    return RoutingPolicy(
+        main_model,
+        fast_model=os.environ.get("SBCT_FAST_MODEL"),
+        max_tokens=max_tokens,
+        final_fallback=os.environ.get("SBCT_FAST_FINAL_FALLBACK", "").lower() in ("1", "true", "yes"),
+        prices=prices,
+    )
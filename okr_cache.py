@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple, Union
+
+import yaml
+
+from TaskModels import OKR, KeyResult, OKRSet
+
+## Prefer the libyaml bindings when PyYAML was built with them. The pure Python
+## loader is an order of magnitude slower on anything but tiny files.
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+
+## filename -> (mtime_ns, size, OKRSet, tag_id lookup)
+_okr_cache: Dict[str, Tuple[int, int, OKRSet, Dict[str, Union[OKR, KeyResult]]]] = {}
+_okr_cache_lock = threading.Lock()
+
+
+def okr_filename() -> str:
+    # Choose the file based on DTYPE, defaulting to the production OKRs
+    dtype = os.environ.get('DTYPE', '')
+    if dtype.lower() == 'demo':
+        return "okr-michael-scott.demo.yaml"
+    return "okr-stephen-barr-2024-q3.yaml"
+
+
+def sidecar_filename(filename: str) -> str:
+    return filename + ".json"
+
+
+def build_okr_lookup(okr_set: OKRSet) -> Dict[str, Union[OKR, KeyResult]]:
+    """
+    Map every OKR and key result tag_id to its model so tags on a task can be
+    resolved without walking the whole set.
+    """
+    lookup = {}
+    for okr in okr_set.okrs:
+        lookup[okr.tag_id] = okr
+        for kr in okr.key_results:
+            lookup[kr.tag_id] = kr
+    return lookup
+
+
+def _read_okr_data(filename: str, st: os.stat_result) -> dict:
+    ## A precompiled JSON sidecar is used when it is at least as new as the YAML
+    sidecar = sidecar_filename(filename)
+    try:
+        if os.stat(sidecar).st_mtime_ns >= st.st_mtime_ns:
+            with open(sidecar, 'r') as file:
+                return json.load(file)
+    except (OSError, ValueError):
+        pass
+
+    with open(filename, 'r') as file:
+        return yaml.load(file, Loader=YamlLoader)
+
+
+def write_okr_sidecar(filename: Optional[str] = None) -> str:
+    """
+    Precompile an OKR YAML file into a JSON sidecar next to it.
+
+    Returns the path of the sidecar that was written.
+    """
+    filename = filename or okr_filename()
+    with open(filename, 'r') as file:
+        yaml_data = yaml.load(file, Loader=YamlLoader)
+    sidecar = sidecar_filename(filename)
+    with open(sidecar, 'w') as file:
+        json.dump(yaml_data, file)
+    return sidecar
+
+
+def load_okr_set(filename: Optional[str] = None) -> Tuple[OKRSet, Dict[str, Union[OKR, KeyResult]]]:
+    """
+    Load an OKR file, returning the parsed OKRSet and its tag_id lookup.
+
+    Results are cached per file and only re-parsed when the file's mtime or
+    size changes, so repeat calls cost a single stat().
+
+    Raises:
+    FileNotFoundError: If the OKR file does not exist.
+    yaml.YAMLError: If the file cannot be parsed.
+    """
+    filename = filename or okr_filename()
+    st = os.stat(filename)
+
+    cached = _okr_cache.get(filename)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2], cached[3]
+
+    with _okr_cache_lock:
+        cached = _okr_cache.get(filename)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2], cached[3]
+
+        okr_set = OKRSet(**_read_okr_data(filename, st))
+        lookup = build_okr_lookup(okr_set)
+        _okr_cache[filename] = (st.st_mtime_ns, st.st_size, okr_set, lookup)
+        return okr_set, lookup
+
+
+def okr_tag_text(tag_id: str, filename: Optional[str] = None) -> str:
+    """
+    The objective (or key result description) a task tag refers to, or an
+    empty string for tags that are not OKR tag_ids.
+    """
+    try:
+        _, lookup = load_okr_set(filename)
+    except (OSError, yaml.YAMLError):
+        return ""
+    item = lookup.get(tag_id)
+    if item is None:
+        return ""
+    if isinstance(item, OKR):
+        return f"{item.objective} {item.initiatives}"
+    return item.description
+
+
+def clear_okr_cache():
+    with _okr_cache_lock:
+        _okr_cache.clear()
+
+
+if __name__ == "__main__":
+    ## python okr_cache.py [okr.yaml ...] precompiles JSON sidecars; with no
+    ## arguments it uses the file DTYPE selects
+    import sys
+    for name in sys.argv[1:] or [okr_filename()]:
+        print(f"Wrote {write_okr_sidecar(name)}")
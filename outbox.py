@@ -0,0 +1,279 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+## Durable write-behind queue for task mutations.
+##
+## Mutations are committed to a local SQLite file and acknowledged straight
+## away; a background worker sends them to ClickUp, merging queued updates to
+## the same task, retrying transient failures with backoff and mapping the
+## provisional ids of queued creates to the real ids once they exist.
+
+PROVISIONAL_PREFIX = "pending-"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key  TEXT UNIQUE NOT NULL,
+    kind             TEXT NOT NULL,
+    task_id          TEXT NOT NULL,
+    payload          TEXT NOT NULL,
+    status           TEXT NOT NULL DEFAULT 'pending',
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at  REAL NOT NULL DEFAULT 0,
+    last_error       TEXT,
+    created_at       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS provisional_ids (
+    provisional_id   TEXT PRIMARY KEY,
+    task_id          TEXT NOT NULL
+);
+"""
+
+
+class OutboxSendError(Exception):
+    """Raised by a send function; `retryable=False` marks the mutation as failed for good."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_provisional(task_id: str) -> bool:
+    return task_id.startswith(PROVISIONAL_PREFIX)
+
+
+class Outbox:
+    """
+    `send(kind, task_id, payload, idempotency_key, attempts)` performs one
+    mutation against ClickUp. It returns the real task id for creates (None
+    otherwise) and raises OutboxSendError or any other exception on failure.
+    """
+
+    def __init__(self, path: str, send: Callable[[str, str, Dict[str, Any], str, int], Optional[str]],
+                 max_attempts: int = 8, flush_interval: float = 0.5):
+        self.path = path
+        self.send = send
+        self.max_attempts = max_attempts
+        self.flush_interval = flush_interval
+
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    ############################################################################
+    ## Queueing
+
+    def enqueue(self, kind: str, task_id: Optional[str], payload: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Durably queue a mutation. Returns (idempotency_key, task_id), where
+        task_id is a new provisional id for creates, and the real id for a
+        change to a provisional task whose create has already been sent.
+        """
+        key = uuid.uuid4().hex
+        if kind == "create":
+            task_id = PROVISIONAL_PREFIX + uuid.uuid4().hex[:12]
+        with self.lock:
+            if kind != "create" and is_provisional(task_id):
+                row = self.db.execute("SELECT task_id FROM provisional_ids WHERE provisional_id = ?",
+                                      (task_id,)).fetchone()
+                if row:
+                    task_id = row["task_id"]
+            self.db.execute(
+                "INSERT INTO outbox (idempotency_key, kind, task_id, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, task_id, json.dumps(payload), time.time()))
+            self.db.commit()
+        self._wake.set()
+        return key, task_id
+
+    def resolve(self, task_id: str) -> Optional[str]:
+        """Map a provisional id to its real id once the create has been sent."""
+        if not is_provisional(task_id):
+            return task_id
+        with self.lock:
+            row = self.db.execute("SELECT task_id FROM provisional_ids WHERE provisional_id = ?",
+                                  (task_id,)).fetchone()
+        return row["task_id"] if row else None
+
+    ############################################################################
+    ## Read-side view of queued writes
+
+    def pending(self, kind: Optional[str] = None, task_id: Optional[str] = None) -> List[sqlite3.Row]:
+        query = "SELECT * FROM outbox WHERE status = 'pending'"
+        args: List[Any] = []
+        if kind is not None:
+            query += " AND kind = ?"
+            args.append(kind)
+        if task_id is not None:
+            query += " AND task_id = ?"
+            args.append(task_id)
+        with self.lock:
+            return self.db.execute(query + " ORDER BY id", args).fetchall()
+
+    def pending_for_tasks(self) -> Dict[str, List[Tuple[str, Dict[str, Any]]]]:
+        """Queued updates and tag additions, grouped by (real or provisional) task id."""
+        changes: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for row in self.pending():
+            if row["kind"] in ("update", "tags"):
+                changes.setdefault(row["task_id"], []).append((row["kind"], json.loads(row["payload"])))
+        return changes
+
+    def pending_creates(self) -> List[Tuple[str, Dict[str, Any], float]]:
+        return [(row["task_id"], json.loads(row["payload"]), row["created_at"])
+                for row in self.pending(kind="create")]
+
+    ############################################################################
+    ## Flushing
+
+    def _coalesce_updates(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fold every queued update for a task into its oldest queued update, so
+        N edits to one task become a single PUT applied in queue order.
+        Returns the rows still to send.
+        """
+        heads: Dict[str, Dict[str, Any]] = {}
+        folded: List[Tuple[int, int]] = []
+        for row in rows:
+            if row["kind"] != "update":
+                continue
+            head = heads.get(row["task_id"])
+            if head is None:
+                heads[row["task_id"]] = row
+            else:
+                merged = json.loads(head["payload"])
+                merged.update(json.loads(row["payload"]))
+                head["payload"] = json.dumps(merged)
+                folded.append((row["id"], head["id"]))
+
+        if not folded:
+            return rows
+        with self.lock:
+            for row_id, head_id in folded:
+                self.db.execute("UPDATE outbox SET status = 'coalesced', last_error = ? WHERE id = ?",
+                                (f"merged into {head_id}", row_id))
+            for head in heads.values():
+                self.db.execute("UPDATE outbox SET payload = ? WHERE id = ?", (head["payload"], head["id"]))
+            self.db.commit()
+        self.coalesced += len(folded)
+
+        folded_ids = {row_id for row_id, _ in folded}
+        return [r for r in rows if r["id"] not in folded_ids]
+
+    def flush(self) -> int:
+        """Send every due mutation once. Returns how many were sent successfully."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _create_failed(self, provisional_id: str) -> bool:
+        return self.create_error(provisional_id) is not None
+
+    def create_error(self, provisional_id: str) -> Optional[str]:
+        """The last error of a create that has failed for good, or None."""
+        with self.lock:
+            row = self.db.execute("SELECT status, last_error FROM outbox WHERE kind = 'create' AND task_id = ?",
+                                  (provisional_id,)).fetchone()
+        if row is None or row["status"] != "failed":
+            return None
+        return row["last_error"] or "unknown error"
+
+    def _flush(self) -> int:
+        with self.lock:
+            rows = [dict(r) for r in self.db.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' ORDER BY id").fetchall()]
+        if not rows:
+            return 0
+
+        ## Coalesce across everything pending, including rows still backing
+        ## off, so a newer edit can never be sent ahead of an older one
+        now = time.time()
+        sent = 0
+        for row in self._coalesce_updates(rows):
+            if row["next_attempt_at"] > now:
+                continue
+            task_id = row["task_id"] if row["kind"] == "create" else self.resolve(row["task_id"])
+            if task_id is None:
+                ## Waiting on the create of a provisional task, unless that failed
+                if self._create_failed(row["task_id"]):
+                    with self.lock:
+                        self.db.execute("UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?",
+                                        ("create of the provisional task failed", row["id"]))
+                        self.db.commit()
+                continue
+            try:
+                new_id = self.send(row["kind"], task_id, json.loads(row["payload"]),
+                                   row["idempotency_key"], row["attempts"])
+            except Exception as e:
+                retryable = getattr(e, "retryable", True)
+                attempts = row["attempts"] + 1
+                status = "pending" if retryable and attempts < self.max_attempts else "failed"
+                with self.lock:
+                    self.db.execute(
+                        "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                        (status, attempts, time.time() + min(60, 2 ** attempts), str(e), row["id"]))
+                    self.db.commit()
+                self.retries += 1
+                continue
+
+            with self.lock:
+                if row["kind"] == "create" and new_id:
+                    self.db.execute("INSERT OR REPLACE INTO provisional_ids VALUES (?, ?)",
+                                    (row["task_id"], new_id))
+                    ## Changes queued against the provisional id now belong to the
+                    ## real task, so reads of it (and coalescing) pick them up
+                    self.db.execute("UPDATE outbox SET task_id = ? WHERE task_id = ? AND kind != 'create' AND status = 'pending'",
+                                    (new_id, row["task_id"]))
+                self.db.execute("UPDATE outbox SET status = 'done', attempts = attempts + 1 WHERE id = ?",
+                                (row["id"],))
+                self.db.commit()
+            sent += 1
+        self.sent += sent
+        return sent
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Outbox flush failed: {e}")
+
+    def start(self) -> "Outbox":
+        if self._worker is None or not self._worker.is_alive():
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, daemon=True, name="sbct-outbox")
+            self._worker.start()
+        return self
+
+    def stop(self, drain_timeout: float = 10.0):
+        """Stop the worker after trying to drain what is queued for up to `drain_timeout` seconds."""
+        deadline = time.time() + drain_timeout
+        while self.pending() and time.time() < deadline:
+            if not self.flush():
+                time.sleep(0.2)
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            counts = dict(self.db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        return {"pending": counts.get("pending", 0), "failed": counts.get("failed", 0),
+                "sent": self.sent, "coalesced": self.coalesced, "retries": self.retries}
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from tracing import tracer
+
+
+class Prefetcher:
+    """
+    Warm likely-needed tool data in the background.
+
+    `loaders` maps a key to a zero-argument function. start() runs them all on
+    a small thread pool; get() then serves a finished result if it is younger
+    than `max_age` seconds, waits for one that is still in flight, and
+    otherwise falls back to calling the loader it was given. Data read some
+    other way (e.g. through a cache the loader warms) can be counted with
+    result() and record(). Hits and misses are kept per key.
+    """
+
+    def __init__(self, loaders: Dict[str, Callable[[], Any]], max_age: float = 120.0, workers: int = 3):
+        self.loaders = loaders
+        self.max_age = max_age
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.futures: Dict[str, Future] = {}
+        self.finished_at: Dict[str, float] = {}
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.cancelled = False
+        self.hits = 0
+        self.misses = 0
+        self.key_stats: Dict[str, Dict[str, int]] = {}
+
+    def _run(self, key: str) -> Any:
+        with tracer.span("prefetch", key=key):
+            result = self.loaders[key]()
+        self.finished_at[key] = time.monotonic()
+        return result
+
+    def start(self) -> "Prefetcher":
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sbct-prefetch")
+        with self.lock:
+            for key in self.loaders:
+                self.futures[key] = self.executor.submit(self._run, key)
+        return self
+
+    def result(self, key: str) -> Optional[Any]:
+        """
+        What the prefetch of `key` produced, waiting for it if it is still
+        running; None if it never ran, was cancelled or failed. Neither a hit
+        nor a miss is counted.
+        """
+        with self.lock:
+            future = None if self.cancelled else self.futures.get(key)
+        if future is None or future.cancelled():
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def record(self, key: str, hit: bool):
+        with self.lock:
+            counts = self.key_stats.setdefault(key, {"hits": 0, "misses": 0})
+            if hit:
+                self.hits += 1
+                counts["hits"] += 1
+            else:
+                self.misses += 1
+                counts["misses"] += 1
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        finished = self.finished_at.get(key)
+        if finished is None or time.monotonic() - finished <= self.max_age:
+            result = self.result(key)
+            if result is not None:
+                self.record(key, True)
+                return result
+        self.record(key, False)
+        return loader()
+
+    def invalidate(self, key: str):
+        """Drop a warmed result, e.g. after a write made it stale."""
+        with self.lock:
+            future = self.futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def cancel(self):
+        """
+        Stop using prefetched data. Loaders that have not started are
+        cancelled; ones already running finish but their results are ignored.
+        """
+        with self.lock:
+            self.cancelled = True
+            futures = list(self.futures.values())
+            self.futures.clear()
+        for future in futures:
+            future.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0,
+                    "keys": {key: dict(counts) for key, counts in self.key_stats.items()}}
@@ -0,0 +1,75 @@
+import hashlib
+import json
+from typing import Any, Dict, Tuple, Union
+
+from TaskModels import TaskList, TaskListDelta
+
+
+def task_fingerprint(task_dict: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(task_dict, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ToolResultTracker:
+    """
+    Remembers which tasks each list query has already returned in one
+    conversation, so a repeated query can send only what changed since.
+
+    One tracker belongs to one conversation_history; it only holds task ids
+    and content fingerprints, not the tasks themselves.
+    """
+
+    def __init__(self):
+        ## query key -> {task_id: fingerprint} as of the last result sent
+        self.sent: Dict[str, Dict[str, str]] = {}
+        self.calls: Dict[str, int] = {}
+
+    def snapshot(self) -> Tuple[Dict[str, Dict[str, str]], Dict[str, int]]:
+        """
+        The tracker's state, for restore() if the turn that is about to run
+        is rolled back and the model never sees its results.
+        """
+        return dict(self.sent), dict(self.calls)
+
+    def restore(self, snapshot: Tuple[Dict[str, Dict[str, str]], Dict[str, int]]):
+        sent, calls = snapshot
+        self.sent = dict(sent)
+        self.calls = dict(calls)
+
+    @staticmethod
+    def query_key(tool_name: str, args: Dict[str, Any]) -> str:
+        return tool_name + ":" + json.dumps(args, sort_keys=True, default=str)
+
+    def encode(self, tool_name: str, args: Dict[str, Any], result: TaskList,
+               full_refresh: bool = False) -> Union[TaskList, TaskListDelta]:
+        """
+        `args` identifies the query and should be the validated input with
+        defaults filled in and full_refresh left out, so equivalent calls
+        spelled differently share a key.
+        """
+        key = self.query_key(tool_name, args)
+        current = {}
+        for task in result.task_list:
+            current[task.id] = task_fingerprint(task.dict())
+
+        previous = self.sent.get(key)
+        self.sent[key] = current
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if previous is None or full_refresh:
+            return result
+
+        added, changed = [], []
+        for task in result.task_list:
+            if task.id not in previous:
+                added.append(task)
+            elif previous[task.id] != current[task.id]:
+                changed.append(task)
+        removed = [task_id for task_id in previous if task_id not in current]
+
+        return TaskListDelta(
+            added=added,
+            changed=changed,
+            removed_task_ids=removed,
+            unchanged_count=len(current) - len(added) - len(changed),
+            previous_call=self.calls[key] - 1,
+            current_datetime=result.current_datetime,
+        )
@@ -1,5 +1,5 @@
 from time import time
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from typing_extensions import Annotated
 from pydantic import BaseModel, Field, ValidationError
 
@@ -24,11 +24,19 @@ from secrets_manager import get_secret
 import dateparser
 import os
 import uuid
-import pickle
 import yaml
 
 from TaskModels import *
 from sbctutil import *
+import clickup_http as cu_http
+from okr_cache import okr_filename, load_okr_set, okr_tag_text
+from session_journal import open_session
+from tracing import tracer
+from prefetch import Prefetcher
+from outbox import Outbox, OutboxSendError, is_provisional
+from result_deltas import ToolResultTracker
+from model_routing import policy_from_env
+from task_index import TaskIndex
 
 from rich.console import Console
 from rich.panel import Panel
@@ -64,8 +72,242 @@ WORKFLOWY_API_KEY = secret["WORKFLOWY_API_KEY"]  ## Not used in this demo
 ch.team_id        = cu_team_id
 ch.headers        = headers
 
+# CONFIGURE SHARED CLICKUP HTTP CLIENT (connection pool + rate limiter)
+cu_http.headers   = headers
+
+# BACKGROUND PREFETCH. SBCT_PREFETCH is a comma separated list of keys to warm
+# while the user types their first message ("none" disables it).
+PREFETCH_KEYS     = [k.strip() for k in os.environ.get("SBCT_PREFETCH", "okrs,week_tasks").split(",")
+                     if k.strip() and k.strip() != "none"]
+PREFETCH_MAX_AGE  = float(os.environ.get("SBCT_PREFETCH_MAX_AGE", "120"))
+prefetcher        = None
+
+# WRITE-BEHIND. With SBCT_WRITE_BEHIND=1 task mutations are queued in a local
+# SQLite outbox and sent to ClickUp in the background.
+WRITE_BEHIND      = os.environ.get("SBCT_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+OUTBOX_PATH       = os.environ.get("SBCT_OUTBOX_PATH", "outbox.sqlite3")
+outbox            = None
+
+## Local BM25 index of every task the tools have seen, for search_tasks. OKR
+## tags are expanded to their objective or key result, so a search for
+## "celebrity impersonations" finds tasks tagged kr-2-1-cold-calls.
+task_index        = TaskIndex(tag_text=okr_tag_text)
+
 
 # HELPERS
+def prefetched(key, loader):
+    """Serve `key` from the background prefetch if it is warm, else call `loader`."""
+    if prefetcher is None:
+        return loader()
+    return prefetcher.get(key, loader)
+
+
+def record_okr_read(okr_set):
+    """
+    Count an OKR read against the prefetcher: a hit when it was served by the
+    parse the "okrs" prefetch put in the cache, a miss when the file had to
+    be parsed again (or was never prefetched).
+    """
+    if prefetcher is None or "okrs" not in prefetcher.loaders:
+        return
+    warmed = prefetcher.result("okrs")
+    prefetcher.record("okrs", warmed is not None and warmed[0] is okr_set)
+
+
+def invalidate_prefetched(*keys):
+    if prefetcher is not None:
+        for key in keys:
+            prefetcher.invalidate(key)
+
+
+## What clickuphelper's get_list_tasks asked for: closed tasks included, so
+## tasks in custom closed statuses are returned along with the rest
+LIST_TASK_PARAMS = {"archived": "false", "include_closed": "true"}
+
+
+def fetch_week_tasks_raw():
+    return cu_http.get_list_tasks(CU_LIST_ID, params=LIST_TASK_PARAMS)
+
+
+def has_scope(scope: TaskScope) -> bool:
+    return bool(scope.team_wide or scope.list_ids or scope.folder_ids or scope.space_ids)
+
+
+def iter_scoped_tasks(scope: TaskScope, params: Optional[Dict[str, Any]] = None,
+                      queued_creates: bool = True,
+                      index_source=TaskIndex.SEEN) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the raw task dicts in a scope, fetching its lists concurrently and
+    yielding each page as it arrives. Tasks that live in several lists are
+    yielded once. Queued creates (which always go to CU_LIST_ID) are added at
+    the end when that list is in scope. Each page is indexed as held by
+    `index_source`. `params` defaults to LIST_TASK_PARAMS.
+    """
+    if params is None:
+        params = LIST_TASK_PARAMS
+    if scope.team_wide:
+        pages = cu_http.iter_team_task_pages(cu_team_id, params)
+        in_scope = True
+    else:
+        list_ids = cu_http.resolve_list_ids(scope.list_ids, scope.folder_ids, scope.space_ids)
+        pages = cu_http.iter_lists_task_pages(list_ids, params)
+        in_scope = CU_LIST_ID in list_ids
+
+    seen = set()
+    for page in pages:
+        page = with_pending_writes(page)
+        task_index.upsert(page, index_source)
+        for task in page:
+            if task["id"] not in seen:
+                seen.add(task["id"])
+                yield task
+    if queued_creates and in_scope:
+        yield from with_pending_writes([], CU_LIST_ID)
+
+
+def send_mutation(kind: str, task_id: str, payload: Dict[str, Any],
+                  idempotency_key: Optional[str] = None, attempts: int = 0) -> Optional[str]:
+    """
+    Send one task mutation to ClickUp. Returns the new task id for creates.
+
+    Raises:
+    OutboxSendError: If ClickUp rejects the request; 429 and 5xx are retryable.
+    """
+    hdrs = {**cu_http.headers, "X-Idempotency-Key": idempotency_key} if idempotency_key else cu_http.headers
+
+    if kind == "create":
+        ## ClickUp has no idempotency keys, so before retrying a create check
+        ## whether an earlier attempt landed after all
+        if attempts > 0:
+            for t in cu_http.get_list_tasks(payload["list_id"], params={"date_created_gt": payload["queued_at_ms"]}):
+                if t["name"] == payload["name"]:
+                    return t["id"]
+        resp = cu_http.request("POST", f"/list/{payload['list_id']}/task", headers=hdrs,
+                               json={"name": payload["name"], "description": payload["description"]})
+    elif kind == "update":
+        resp = cu_http.request("PUT", f"/task/{task_id}", headers=hdrs, json=payload)
+    elif kind == "comment":
+        resp = cu_http.request("POST", f"/task/{task_id}/comment", headers=hdrs, json=payload)
+    elif kind == "tags":
+        for tag_id in payload["tag_ids"]:
+            resp = cu_http.request("POST", f"/task/{task_id}/tag/{tag_id}", headers=hdrs)
+            if not resp.ok:
+                break
+    else:
+        raise OutboxSendError(f"Unknown mutation kind: {kind}", retryable=False)
+
+    if not resp.ok:
+        raise OutboxSendError(f"ClickUp returned {resp.status_code}: {resp.text[:200]}",
+                              retryable=resp.status_code == 429 or resp.status_code >= 500)
+    return resp.json().get("id") if kind == "create" else None
+
+
+def submit_mutation(kind: str, task_id: Optional[str], payload: Dict[str, Any]) -> TaskUpdateModel:
+    """
+    Apply a mutation now, or queue it in the outbox when write-behind is on.
+    Queued mutations are acknowledged immediately; creates get a provisional id.
+    """
+    invalidate_prefetched("week_tasks")
+    if outbox is not None:
+        _, task_id = outbox.enqueue(kind, task_id, payload)
+        index_mutation(kind, task_id, payload)
+        return TaskUpdateModel(task_id=task_id, updated=True, queued=True)
+
+    try:
+        new_id = send_mutation(kind, task_id, payload)
+    except OutboxSendError as e:
+        print(f"Task mutation failed: {e}")
+        return TaskUpdateModel(task_id=task_id or '', updated=False)
+    index_mutation(kind, new_id or task_id, payload)
+    return TaskUpdateModel(task_id=new_id or task_id, updated=True)
+
+
+def index_mutation(kind: str, task_id: str, payload: Dict[str, Any]):
+    """Keep the search index in step with a mutation that was just applied or queued."""
+    if kind == "create":
+        ## Held by the list it is created in, so the next load of that list,
+        ## which returns the real task instead, releases the provisional one
+        task_index.upsert([provisional_task(task_id, payload, time())], ("list", CU_LIST_ID))
+    elif kind in ("update", "tags"):
+        task_index.update(task_id, lambda task: _apply_change(task, kind, payload))
+
+
+PRIORITY_NAMES = {1: "urgent", 2: "high", 3: "normal", 4: "low"}
+
+def _apply_change(task: Dict[str, Any], kind: str, payload: Dict[str, Any]):
+    if kind == "tags":
+        names = {t["name"] for t in task["tags"]}
+        task["tags"] = task["tags"] + [{"name": t} for t in payload["tag_ids"] if t not in names]
+        return
+    for key, value in payload.items():
+        if key in ("name", "description", "time_estimate"):
+            task[key] = value
+        elif key == "markdown_description":
+            task["description"] = value
+        elif key == "status":
+            task["status"] = {**(task.get("status") or {}), "status": value}
+        elif key in ("due_date", "start_date"):
+            ## Only unix millis can be shown; anything else is left for ClickUp to reject
+            if value is None:
+                task[key] = None
+            elif isinstance(value, int) and not isinstance(value, bool):
+                task[key] = str(value)
+            elif isinstance(value, str) and value.isdigit():
+                task[key] = value
+        elif key == "priority":
+            task["priority"] = None if value is None else {
+                "color": None, "id": str(value), "orderindex": str(value),
+                "priority": PRIORITY_NAMES.get(value, str(value))}
+
+
+def with_pending_writes(tasks: List[Dict[str, Any]], list_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Overlay queued outbox writes on raw task dicts so reads see them before
+    they reach ClickUp. Queued creates for `list_id` are appended. The input
+    dicts may be shared with other readers, so changed tasks are copied.
+    """
+    if outbox is None:
+        return tasks
+    changes = outbox.pending_for_tasks()
+    creates = outbox.pending_creates() if list_id is not None else []
+    if not changes and not creates:
+        return tasks
+
+    result = []
+    for task in tasks:
+        if task["id"] in changes:
+            task = dict(task)
+            for kind, payload in changes[task["id"]]:
+                _apply_change(task, kind, payload)
+        result.append(task)
+
+    for provisional_id, payload, created_at in creates:
+        if payload["list_id"] != list_id:
+            continue
+        task = provisional_task(provisional_id, payload, created_at)
+        for kind, change in changes.get(provisional_id, []):
+            _apply_change(task, kind, change)
+        result.append(task)
+    return result
+
+
+def provisional_task(provisional_id: str, payload: Dict[str, Any], created_at: float) -> Dict[str, Any]:
+    return {
+        "id": provisional_id,
+        "name": payload["name"],
+        "description": payload["description"],
+        "status": {"status": "to do"},
+        "priority": None,
+        "date_created": str(int(created_at * 1000)),
+        "date_done": None,
+        "date_closed": None,
+        "due_date": None,
+        "start_date": None,
+        "time_estimate": None,
+        "tags": [],
+    }
+
+
 def dt_validate(tu_input: TaskUpdate) -> Tuple[TaskUpdate, Dict[str, str]]:
     errors = {}
 
@@ -88,36 +330,45 @@ def dt_validate(tu_input: TaskUpdate) -> Tuple[TaskUpdate, Dict[str, str]]:
     return tu_input, errors
 
 
-def tx_to_Task(tx: ch.Task) -> Task:
+def task_dict_to_Task(task: Dict[str, Any]) -> Task:
+    """Convert a raw ClickUp task dict (as returned by the API) into a Task."""
+    with tracer.accumulate("convert_task"):
+        return _task_dict_to_Task(task)
+
+
+def _task_dict_to_Task(task: Dict[str, Any]) -> Task:
     date_fields = ["date_created", "date_done", "date_closed", "due_date", "start_date"]
     time_qty_fields = ["time_estimate"]
     
     task_dict = {
-        "name": tx.name,
-        # "id": tx.id, ## TODO this might come back to bite me. Keep an eye here.
-        "id" : tx.task["id"],
-        "priority": tx.task["priority"],
-        "status": tx.status,
-        "description": tx.task["description"],
-        "tags": [x["name"] for x in tx.task["tags"]]
+        "name": task["name"],
+        "id" : task["id"],
+        "priority": task["priority"],
+        "status": task["status"]["status"],
+        "description": task.get("description") or "",
+        "tags": [x["name"] for x in task["tags"]]
     }
     
     for field in date_fields:
-        if field in tx.task:
+        if field in task:
             task_dict[field] = (
-                None if tx.task[field] is None
-                else convert_unix_to_iso8601_pacific(tx.task[field])
+                None if task[field] is None
+                else convert_unix_to_iso8601_pacific(task[field])
             )
     
     for field in time_qty_fields:
-        if field in tx.task:
+        if field in task:
             task_dict[field] = (
-                None if tx.task[field] is None
-                else milliseconds_to_hh_mm_ss(tx.task[field])
+                None if task[field] is None
+                else milliseconds_to_hh_mm_ss(task[field])
             )
     
     return Task(**task_dict)
 
+
+def tx_to_Task(tx: ch.Task) -> Task:
+    return task_dict_to_Task(tx.task)
+
 # CORE FUNCTIONALITY
 # - Add tags to task
 # - Update task 
@@ -131,16 +382,15 @@ def tx_to_Task(tx: ch.Task) -> Task:
 # - Load OKRs into context
 # - Get all tasks in list
 def add_tags_to_task_core(task_tags: TaskTags) -> TaskUpdateModel:
-    tx = ch.Task(task_tags.task_id)
-    for tag_id in task_tags.tag_ids:
-        url = f"https://api.clickup.com/api/v2/task/{task_tags.task_id}/tag/{tag_id}"
-        response = requests.post(url, headers=ch.headers)
-    return TaskUpdateModel(task_id=task_tags.task_id, updated=True)
+    return submit_mutation("tags", task_tags.task_id, {"tag_ids": task_tags.tag_ids})
 
 
 def update_task_core(task_update: TaskUpdate) -> TaskUpdateModel:
-    url = f"https://api.clickup.com/api/v2/task/{task_update.task_id}"
     task_update, dt_errors = dt_validate(task_update)
+    if dt_errors:
+        ## Never send or queue a date string ClickUp (and our overlays) can't read
+        return TaskUpdateModel(task_id=task_update.task_id, updated=False,
+                               error="; ".join(f"{k}: {v}" for k, v in dt_errors.items()))
     payload = task_update.dict(exclude_unset=True, exclude={'task_id'})    
     if task_update.due_date_millis:
         payload["due_date"] = task_update.due_date_millis
@@ -149,45 +399,49 @@ def update_task_core(task_update: TaskUpdate) -> TaskUpdateModel:
         payload["start_date"] = task_update.start_date_millis
         del payload["start_date_millis"]
     print(f"Calling clickup with payload: {payload}")
-    resp = requests.put(url, json=payload, headers=ch.headers)
-    return TaskUpdateModel(task_id=task_update.task_id, updated=resp.status_code == 200)
+    return submit_mutation("update", task_update.task_id, payload)
 
 def create_task_core(task_create: TaskCreate) -> TaskUpdateModel:
-    tx = ch.post_task(CU_LIST_ID, task_create.task_name, task_create.task_description)
-    response_json = tx.json()
-    return TaskUpdateModel(task_id=response_json.get('id'), updated=True)
+    payload = {
+        "list_id": CU_LIST_ID,
+        "name": task_create.task_name,
+        "description": task_create.task_description,
+        "queued_at_ms": int(time() * 1000),
+    }
+    return submit_mutation("create", None, payload)
 
 def add_comment_to_task_core(task_comment: TaskAddComment) -> TaskUpdateModel:
-    tx = ch.Task(task_comment.task_id)
-    x = tx.post_comment(task_comment.comment)
-    return TaskUpdateModel(task_id=task_comment.task_id, updated=True)
+    return submit_mutation("comment", task_comment.task_id, {"comment_text": task_comment.comment})
 
 
 def set_task_to_completed_core(task_id: TaskIdModel) -> TaskUpdateModel:
-    tx = ch.Task(task_id.task_id)
-    tx.post_status("completed")
-    return TaskUpdateModel(task_id=task_id.task_id, updated=True)
+    return submit_mutation("update", task_id.task_id, {"status": "completed"})
 
 def get_week_to_date_tasks_core(input_params: WeekToDateTasksInput) -> TaskList:
     ## This should use server side filtering.
     ## Look at sjbutil.get_episode_shorts for how to do this.
     ## This should be done with sjbutil.
-    print(f"Getting tasks from: {CU_LIST_NAME}")
-    admin_tasks = ch.get_list_tasks("DevGraph", None, CU_LIST_NAME)
+    if has_scope(input_params):
+        print("Getting tasks from: " + ("the whole workspace" if input_params.team_wide else "the requested lists"))
+        admin_tasks = iter_scoped_tasks(input_params)
+    else:
+        print(f"Getting tasks from: {CU_LIST_NAME}")
+        admin_tasks = with_pending_writes(prefetched("week_tasks", fetch_week_tasks_raw), CU_LIST_ID)
+        task_index.load(("list", CU_LIST_ID), admin_tasks)
     simple_tasks_list = []
     date_sunday_lb = get_most_recent_sunday_as_timestamp()
     
-    for t_id, tx in admin_tasks.tasks.items():
+    for tx in admin_tasks:
         if input_params.skip_past_due:
-            due_date = tx.task.get("due_date")
+            due_date = tx.get("due_date")
             if due_date is None or date_sunday_lb > int(due_date):
-                print(f"{tx.name} is past due or due date is not set. Skipping")
+                print(f"{tx['name']} is past due or due date is not set. Skipping")
                 continue
         
-        if tx.status in ['completed', 'cancelled']:
+        if tx["status"]["status"] in ['completed', 'cancelled']:
             continue
         
-        task = tx_to_Task(tx)
+        task = task_dict_to_Task(tx)
         simple_tasks_list.append(task)
     
     for st in simple_tasks_list:
@@ -199,19 +453,37 @@ def get_week_to_date_tasks_core(input_params: WeekToDateTasksInput) -> TaskList:
     )
 
 def get_specific_task(task_id: TaskIdModel) -> Task:
-    tx = ch.Task(task_id.task_id)
-    return tx_to_Task(tx)
+    if outbox is not None and is_provisional(task_id.task_id):
+        real_id = outbox.resolve(task_id.task_id)
+        if real_id is None:
+            for task in with_pending_writes([], CU_LIST_ID):
+                if task["id"] == task_id.task_id:
+                    return task_dict_to_Task(task)
+            error = outbox.create_error(task_id.task_id)
+            if error is not None:
+                raise ValueError(f"Creating provisional task {task_id.task_id} failed: {error}")
+            raise ValueError(f"Unknown provisional task id: {task_id.task_id}")
+        task_id = TaskIdModel(task_id=real_id)
+    try:
+        raw_task = cu_http.get_task(task_id.task_id)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            task_index.remove(task_id.task_id)
+        raise
+    task = with_pending_writes([raw_task])[0]
+    task_index.upsert([task])
+    return task_dict_to_Task(task)
 
 
  
 def list_tasks_by_tags(tag_id_list: TagIdList) -> TaskList:
     """
-    Query tasks from a ClickUp list, filtered by tag IDs.
+    Query tasks from the demo/work list, or from the lists, folders and spaces
+    named in the input, filtered by tag IDs.
 
     Args:
-    api_token (str): Your ClickUp API token.
-    list_id (str): The ID of the list to query tasks from.
-    tag_id_list (TagIdList): A Pydantic model containing a list of tag IDs to filter the tasks by.
+    tag_id_list (TagIdList): A Pydantic model containing a list of tag IDs to filter the tasks by,
+                             and optionally the scope to search.
 
     Returns:
     TaskList: A Pydantic model containing a list of Task objects.
@@ -220,9 +492,6 @@ def list_tasks_by_tags(tag_id_list: TagIdList) -> TaskList:
     requests.RequestException: If there's an error with the API request.
     ValueError: If the API response indicates an error.
     """
-    base_url = f'https://api.clickup.com/api/v2/list/{CU_LIST_ID}/task'
-    
-    headers = ch.headers    
     params = {
         'tags[]': tag_id_list.tag_ids,
         'subtasks': 'true',  # Include subtasks in the response
@@ -230,19 +499,12 @@ def list_tasks_by_tags(tag_id_list: TagIdList) -> TaskList:
     }
     
     try:
-        response = requests.get(base_url, headers=headers, params=params)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        data = response.json()
-        
-        if 'err' in data:
-            raise ValueError(f"API Error: {data['err']}")
-        
-        # Convert the API response to our Pydantic model
+        # The list endpoint already returns full task bodies, so convert them
+        # directly instead of re-fetching every task by id
+        scope = tag_id_list if has_scope(tag_id_list) else TaskScope(list_ids=[CU_LIST_ID])
         tasks = []
-        for task_data in data['tasks']:
-            tx = ch.Task(task_data['id'])
-            task_model = tx_to_Task(tx)
+        for task_data in iter_scoped_tasks(scope, params, queued_creates=False):
+            task_model = task_dict_to_Task(task_data)
             tasks.append(task_model)
 
         return TaskList(task_list=tasks,
@@ -257,19 +519,13 @@ def get_current_datetime(NullModel) -> CurrentDateTime:
     
 
 def load_okrs_into_context(NullModel) -> OKRSet:
-    # Get the DTYPE from environment variable, defaulting to an empty string if not set
-    dtype = os.environ.get('DTYPE', '')
+    # The DTYPE environment variable picks the file; parsed OKRs are cached
+    # until the file changes on disk. The prefetcher only warms that cache,
+    # so an edited file is always picked up here.
+    filename = okr_filename()
 
-    # Choose the file based on DTYPE
-    if dtype.lower() == 'demo':
-        filename = "okr-michael-scott.demo.yaml"
-    else:
-        filename = "okr-stephen-barr-2024-q3.yaml"
-
-    # Attempt to load the YAML file
     try:
-        with open(filename, 'r') as file:
-            yaml_data = yaml.safe_load(file)
+        okr_set, _ = load_okr_set(filename)
     except FileNotFoundError:
         print(f"Error: The file {filename} was not found.")
         return None
@@ -277,22 +533,73 @@ def load_okrs_into_context(NullModel) -> OKRSet:
         print(f"Error parsing the YAML file: {e}")
         return None
 
-    # Assuming OKRSet is a class that can be instantiated with a dictionary
-    return OKRSet(**yaml_data)
+    record_okr_read(okr_set)
+    return okr_set
 
 
 # https://app.clickup.com/6914877/v/l/6-182675650-1
-def get_all_tasks(NullModel) -> TaskList:
-    all_tasks_tx = ch.get_list_tasks("DevGraph", None, "Administrative")
+ALL_TASKS_SPACE   = "DevGraph"
+ALL_TASKS_FOLDER  = None
+ALL_TASKS_LIST    = "Administrative"
+_all_tasks_list_id = None
+
+
+def all_tasks_list_id() -> str:
+    """The id of the list get_all_tasks reads by default, looked up by name once."""
+    global _all_tasks_list_id
+    if _all_tasks_list_id is None:
+        _all_tasks_list_id = cu_http.find_list_id(cu_team_id, ALL_TASKS_SPACE, ALL_TASKS_FOLDER, ALL_TASKS_LIST)
+    return _all_tasks_list_id
+
+
+def get_all_tasks(input_params: AllTasksInput) -> TaskList:
+    if has_scope(input_params):
+        all_tasks = iter_scoped_tasks(input_params)
+    else:
+        list_id = all_tasks_list_id()
+        raw_tasks = cu_http.get_list_tasks(list_id, params=LIST_TASK_PARAMS)
+        all_tasks = with_pending_writes(raw_tasks)
+        task_index.load(("list", list_id), all_tasks)
     tlist = []
-    for task_id, task in all_tasks_tx.tasks.items():
-        tm = tx_to_Task(task)
+    for task in all_tasks:
+        tm = task_dict_to_Task(task)
         tlist.append(tm)
     return TaskList(
         task_list=tlist,
         current_datetime=datetime.now(pytz.timezone('US/Pacific'))
     )
 
+
+def search_tasks(search: TaskSearchInput) -> TaskSearchResult:
+    """
+    Rank the tasks in the local index against the query with BM25. The lists
+    in scope (the demo/work list by default) are fetched into the index the
+    first time they are searched, or again when `refresh` is set; after that
+    a search makes no ClickUp calls. Every task already seen by other tools
+    is searched as well.
+    """
+    if has_scope(search):
+        source = ("scope", tuple(search.list_ids), tuple(search.folder_ids),
+                  tuple(search.space_ids), search.team_wide)
+        if search.refresh or not task_index.has_source(source):
+            task_index.load(source, iter_scoped_tasks(search, index_source=source))
+    else:
+        source = ("list", CU_LIST_ID)
+        if search.refresh:
+            invalidate_prefetched("week_tasks")
+            task_index.load(source, with_pending_writes(fetch_week_tasks_raw(), CU_LIST_ID))
+        elif not task_index.has_source(source):
+            task_index.load(source, with_pending_writes(prefetched("week_tasks", fetch_week_tasks_raw), CU_LIST_ID))
+
+    hits = [TaskSearchHit(score=round(score, 3), task=task_dict_to_Task(task))
+            for score, task in task_index.search(search.query, search.k)]
+    return TaskSearchResult(
+        query=search.query,
+        hits=hits,
+        indexed_tasks=len(task_index),
+        current_datetime=datetime.now(pytz.timezone('US/Pacific'))
+    )
+
     
 ################################################################################
 ## Creating a set of tool schemas so I can use it for an agent
@@ -331,8 +638,9 @@ function_io_map = {
     "get_week_to_date_tasks_core": {
         "input": WeekToDateTasksInput,
         "output": TaskList,
-        "description": "Retrieves tasks due in the current week",
-        "function": get_week_to_date_tasks_core
+        "description": "Retrieves tasks due in the current week, from the default list or from any set of lists, folders and spaces (or the whole workspace) fetched in one call. Repeating the call in a conversation returns only the added, changed and removed tasks unless full_refresh is set",
+        "function": get_week_to_date_tasks_core,
+        "delta": True
     },
     "get_specific_task": {
         "input": TaskIdModel,
@@ -343,8 +651,9 @@ function_io_map = {
     "list_tasks_by_tag" : {
         "input" : TagIdList,
         "output" : TaskList,
-        "description" : "Gets a list of tasks with certain tags",
-        "function" : list_tasks_by_tags
+        "description" : "Gets a list of tasks with certain tags, from the default list or from any set of lists, folders and spaces (or the whole workspace). Repeating the call in a conversation returns only the added, changed and removed tasks unless full_refresh is set",
+        "function" : list_tasks_by_tags,
+        "delta" : True
     },
     "get_current_datetime" : {
         "input" : NullModel,
@@ -359,10 +668,17 @@ function_io_map = {
         "function" : load_okrs_into_context
     },
     "get_all_tasks" : {
-        "input" : NullModel,
+        "input" : AllTasksInput,
         "output" : TaskList,
-        "description" : "Get all tasks",
-        "function" : get_all_tasks
+        "description" : "Get all tasks in the administrative list, or in any set of lists, folders and spaces (or the whole workspace) fetched in one call. Repeating the call in a conversation returns only the added, changed and removed tasks unless full_refresh is set",
+        "function" : get_all_tasks,
+        "delta" : True
+    },
+    "search_tasks" : {
+        "input" : TaskSearchInput,
+        "output" : TaskSearchResult,
+        "description" : "Find tasks by what they are about (e.g. 'the Scranton branch report') using a local full-text index over task names, descriptions, tags and the OKRs those tags refer to. Returns the top k matches with scores. Prefer this over get_all_tasks when looking for particular tasks",
+        "function" : search_tasks
     }
 }
 
@@ -393,7 +709,14 @@ for func_name, func_info in function_io_map.items():
 # print(json.dumps(tools, indent=2))
 
 
-def process_tool_call(tool_name, tool_input):
+def process_tool_call(tool_name, tool_input, result_tracker=None):
+    """
+    Validate the input, run the tool and return its result as a dict. When a
+    ToolResultTracker is given, tools marked "delta" in function_io_map return
+    only the changes since the same query was last answered in the conversation.
+    A ValueError raised by the tool (e.g. an unknown provisional task id) is
+    returned as {"error": ...} so the model can read it and carry on.
+    """
     if tool_name not in function_io_map:
         raise ValueError(f"Unknown tool: {tool_name}")
 
@@ -402,20 +725,35 @@ def process_tool_call(tool_name, tool_input):
     output_model = func_info['output']
     function = func_info['function']
 
-    try:
-        # Validate and create input object
-        validated_input = input_model(**tool_input)
-    except ValidationError as e:
-        return {"error": f"Invalid input: {str(e)}"}
-
-    # Call the function directly using the reference from function_io_map
-    result = function(validated_input)
-
-    # Check if the result is of the expected output type
-    if not isinstance(result, output_model):
-        return {"error": f"Function returned unexpected type. Expected {output_model.__name__}, got {type(result).__name__}"}
-
-    return result.dict()
+    with tracer.span("tool.call", tool=tool_name) as span:
+        try:
+            # Validate and create input object
+            with tracer.accumulate("validate"):
+                validated_input = input_model(**tool_input)
+        except ValidationError as e:
+            span.set("error", "invalid input")
+            return {"error": f"Invalid input: {str(e)}"}
+
+        # Call the function directly using the reference from function_io_map
+        try:
+            with tracer.span("tool.function", tool=tool_name):
+                result = function(validated_input)
+        except ValueError as e:
+            span.set("error", "tool error")
+            return {"error": str(e)}
+
+        # Check if the result is of the expected output type
+        if not isinstance(result, output_model):
+            span.set("error", "unexpected output type")
+            return {"error": f"Function returned unexpected type. Expected {output_model.__name__}, got {type(result).__name__}"}
+
+        if result_tracker is not None and func_info.get("delta"):
+            result = result_tracker.encode(tool_name, validated_input.dict(exclude={"full_refresh"}), result,
+                                           full_refresh=getattr(validated_input, "full_refresh", False))
+            span.set("delta", isinstance(result, TaskListDelta))
+
+        with tracer.accumulate("serialize"):
+            return result.dict()
 
 ################################################################################
 ## Do the anthropic part
@@ -457,6 +795,10 @@ from anthropic import AnthropicBedrock
 client = AnthropicBedrock()
 MODEL_NAME= "anthropic.claude-3-5-sonnet-20240620-v1:0"
 
+## Which model and max_tokens each call gets; see model_routing.py.
+## SBCT_FAST_MODEL sends tool continuations to a cheaper model.
+routing = policy_from_env(MODEL_NAME)
+
 
 tc1 = TaskCreate(task_name = "Test task anthropic 1",
                  task_description = "The descr of TTA1")
@@ -491,7 +833,7 @@ def print_function_io_map(function_io_map):
 
     console.print(Panel(table, expand=False, border_style="red"))
 
-def handle_response_list(response_content, conversation_history, debug=False):
+def handle_response_list(response_content, conversation_history, debug=False, result_tracker=None):
     """
     Print out the response, processing a tool call and adding it to the history if necessary.
 
@@ -518,7 +860,7 @@ def handle_response_list(response_content, conversation_history, debug=False):
                 console.print(Panel(json.dumps(tool_input, indent=2), title="Tool Input", expand=False))
                 console.print(f"\n[bold magenta]...calling tool [/bold magenta] {tool_name}")
 
-            tool_result = process_tool_call(tool_name, tool_input)
+            tool_result = process_tool_call(tool_name, tool_input, result_tracker=result_tracker)
             if debug:
                 console.print(Panel(json.dumps(tool_result, indent=2), title="Tool Result", expand=False))
 
@@ -540,19 +882,29 @@ def handle_response_list(response_content, conversation_history, debug=False):
     return conversation_history
     
 
-def chatbot_interaction(user_message, conversation_history, debug=False):
+def create_message(conversation_history, kind):
+    """
+    `kind` is "initial" for the reply to a user message and "continuation"
+    after tool results; the routing policy picks the model and max_tokens.
+    """
+    response, tier, model = routing.call(client, kind, tools=tools, messages=conversation_history)
+    if tier == "fast":
+        console.print(f"[dim]({kind} handled by {model})[/dim]")
+    return response
+
+def chatbot_interaction(user_message, conversation_history, debug=False, result_tracker=None):
+    with tracer.turn("chat.turn", history_length=len(conversation_history)):
+        return _chatbot_interaction(user_message, conversation_history, debug=debug,
+                                    result_tracker=result_tracker)
+
+def _chatbot_interaction(user_message, conversation_history, debug=False, result_tracker=None):
 
     console.print(Panel(f"[bold blue]User Message:[/bold blue] {user_message}", expand=False))
     
     # Add the new user message to the conversation history and ask the question
     conversation_history.append({"role": "user", "content": user_message})
 
-    response = client.messages.create(
-        model=MODEL_NAME,
-        max_tokens=200000,
-        tools=tools,
-        messages=conversation_history
-    )
+    response = create_message(conversation_history, "initial")
     
     console.print("\n[bold green]Initial Response:[/bold green]")
     resp_type_list = [str(type(x)) for x in response.content]
@@ -567,15 +919,10 @@ def chatbot_interaction(user_message, conversation_history, debug=False):
     if response.stop_reason == 'tool_use':
         while response.stop_reason == 'tool_use':
 
-            conversation_history = handle_response_list(response.content, conversation_history, debug=debug)
+            conversation_history = handle_response_list(response.content, conversation_history, debug=debug, result_tracker=result_tracker)
 
             ## We we are using a tool, we need to follow up.
-            response2 = client.messages.create(
-                model=MODEL_NAME,
-                max_tokens=4096,
-                tools=tools,
-                messages=conversation_history
-            )
+            response2 = create_message(conversation_history, "continuation")
             console.print("\n[bold green]Tool Follow-up Response:[/bold green]")
             console.print(f"[yellow]Stop Reason:[/yellow] {response2.stop_reason}")
 
@@ -586,13 +933,13 @@ def chatbot_interaction(user_message, conversation_history, debug=False):
             response = response2
 
         ## Finally, once I have excited the while loop, inject the last thing into the history
-        conversation_history = handle_response_list(response.content, conversation_history, debug=debug)
+        conversation_history = handle_response_list(response.content, conversation_history, debug=debug, result_tracker=result_tracker)
         
     else: ## For some other stop reason. This handles that we haven't even gone into the tool_use
           ## while loop
         console.print(f"[yellow]Stop Reason (else):[/yellow] {response.stop_reason}")
         # console.print(Panel(Markdown(str(response.content)), title="Content", expand=False))
-        conversation_history = handle_response_list(response.content, conversation_history, debug=debug)
+        conversation_history = handle_response_list(response.content, conversation_history, debug=debug, result_tracker=result_tracker)
             
     return None , conversation_history
 
@@ -625,38 +972,82 @@ def multiline_input(prompt_text):
     )
     return answer
 
-def generate_session_id():
-    return str(uuid.uuid4())
+def load_session(name=None):
+    """
+    Open the named session journal (SBCT_SESSION, or "default"), creating it
+    if needed. Messages are written to the journal as they are appended.
+    """
+    name = name or os.environ.get("SBCT_SESSION", "default")
+    conversation_history = open_session(name)
+    return conversation_history.journal.session_id, conversation_history
+
+def close_session(conversation_history):
+    conversation_history.journal.close()
+    console.print(f"[bold green]Session saved: {conversation_history.journal.session_id}[/bold green]")
 
-def save_session(session_id, conversation_history, filename="session.pickle"):
-    session_data = {
-        "session_id": session_id,
-        "conversation_history": conversation_history
+def start_prefetch():
+    """
+    Warm the OKR cache (with its tag_id map) and this week's tasks in the
+    background, so the first tool calls of a session don't wait on them.
+    """
+    global prefetcher
+    loaders = {
+        "okrs": lambda: load_okr_set(okr_filename()),
+        "week_tasks": fetch_week_tasks_raw,
     }
-    with open(filename, "wb") as f:  # Note the "wb" mode for writing binary
-        pickle.dump(session_data, f)
-    console.print(f"[bold green]Session saved: {session_id}[/bold green]")
-
-def load_session(filename="session.pickle"):
-    if os.path.exists(filename):
-        with open(filename, "rb") as f:  # Note the "rb" mode for reading binary
-            session_data = pickle.load(f)
-        console.print(f"[bold green]Loaded existing session: {session_data['session_id']}[/bold green]")
-        return session_data["session_id"], session_data["conversation_history"]
-    return None, None
+    loaders = {k: v for k, v in loaders.items() if k in PREFETCH_KEYS}
+    if loaders:
+        prefetcher = Prefetcher(loaders, max_age=PREFETCH_MAX_AGE).start()
+    return prefetcher
+
+def stop_prefetch():
+    global prefetcher
+    if prefetcher is None:
+        return
+    prefetcher.cancel()
+    stats = prefetcher.stats()
+    per_key = ", ".join(f"{key} {counts['hits']}/{counts['hits'] + counts['misses']}"
+                        for key, counts in stats["keys"].items())
+    console.print(f"[blue]Prefetch: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate; {per_key or 'no reads'})[/blue]")
+    prefetcher = None
+
+def start_outbox():
+    """Open the outbox and start its background flusher when write-behind is enabled."""
+    global outbox
+    if WRITE_BEHIND and outbox is None:
+        outbox = Outbox(OUTBOX_PATH, send_mutation).start()
+    return outbox
+
+def stop_outbox():
+    global outbox
+    if outbox is None:
+        return
+    outbox.stop()
+    stats = outbox.stats()
+    console.print(f"[blue]Outbox: {stats['sent']} sent, {stats['coalesced']} coalesced, "
+                  f"{stats['pending']} still queued, {stats['failed']} failed[/blue]")
+    outbox = None
+
+def print_routing_stats():
+    for tier, stats in routing.stats().items():
+        console.print(f"[blue]Model ({tier}): {stats['calls']} calls, "
+                      f"{stats['mean_latency_ms']:.0f} ms mean, "
+                      f"{stats['input_tokens']} in / {stats['output_tokens']} out tokens, "
+                      f"${stats['cost_usd']:.4f}, {stats['fallbacks']} fell back[/blue]")
 
 def main():
     console.print("[bold cyan]Welcome to the Task Management System![/bold cyan]")
 
-    
-    # Try to load an existing session, or create a new one if it doesn't exist
     session_id, conversation_history = load_session()
-    if session_id is None:
-        session_id = generate_session_id()
-        conversation_history = []
-        console.print(f"[bold green]Created new session: {session_id}[/bold green]")
-    else:
+    if conversation_history:
         console.print(f"[bold green]Loaded existing session: {session_id}[/bold green]")
+    else:
+        console.print(f"[bold green]Created new session: {session_id}[/bold green]")
+
+    start_prefetch()
+    start_outbox()
+    result_tracker = ToolResultTracker()
 
     console.print(f"[bold blue]Tools:[/bold blue]")
     for k,v in function_io_map.items():
@@ -668,17 +1059,19 @@ def main():
         
         if user_input.lower() == 'exit':
             console.print("[bold cyan]Thank you for using the Task Management System. Goodbye![/bold cyan]")
-            save_session(session_id, conversation_history)
+            stop_prefetch()
+            stop_outbox()
+            print_routing_stats()
+            close_session(conversation_history)
             break
         
         if not user_input:
             console.print("[bold red]Empty input. Please type a message or 'exit' to quit.[/bold red]")
             continue
         
-        _ , conversation_history = chatbot_interaction(user_input, conversation_history)
+        _ , conversation_history = chatbot_interaction(user_input, conversation_history,
+                                                       result_tracker=result_tracker)
 
-        # # Save the session after each interaction
-        # save_session(session_id, conversation_history)
         # md = Markdown(
         #     response,
         #     code_theme="monokai"
@@ -0,0 +1,585 @@
+"""
+Offline replay harness and load benchmark.
+
+Replays recorded conversations against local stand-ins for every external
+service, so performance changes can be measured without touching ClickUp or
+Bedrock:
+
+- StubClickUp: an in-process HTTP server speaking the subset of the ClickUp v2
+  API the tools use, with configurable latency, rate limit and list size.
+- FakeMessagesClient: a drop-in for the Anthropic client that returns scripted
+  ToolUseBlock sequences followed by a text reply.
+
+Input uses the requests.jsonl format: one JSON object per line with
+request_id, title and body. `body` is sent as the user message. Optional keys:
+
+    session     records sharing a session replay into one conversation
+                (default: each record is its own conversation)
+    tool_calls  list of model responses, each a list of {"name", "input"}
+                tool uses, issued before the final text reply
+    reply       text of the final reply
+
+Reports p50/p95/p99 turn latency, ClickUp API calls per turn, tokens per
+turn and peak memory:
+
+    python sbct_bench.py requests.jsonl --list-size 500 --latency-ms 80
+"""
+import argparse
+import contextlib
+import contextvars
+import io
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from model_routing import policy_from_env
+from session_journal import block_to_dict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+DEFAULT_TOOL_CALLS = [[{"name": "get_week_to_date_tasks_core", "input": {}}]]
+BENCH_TEAM_ID = "bench-team"
+BENCH_LIST_ID = "bench-list"
+BENCH_LIST_NAME = "Bench"
+BENCH_SPACE_ID = "bench-space"
+BENCH_FOLDER_ID = "bench-folder"
+
+
+################################################################################
+## Stub ClickUp server
+
+def make_stub_task(list_id: str, n: int, now_ms: int) -> Dict[str, Any]:
+    rng = random.Random(f"{list_id}-{n}")
+    due = now_ms + rng.randint(-14, 14) * 86400000
+    return {
+        "id": f"{list_id}-{n}",
+        "name": f"Task {n} in {list_id}",
+        "description": f"Generated task {n} for list {list_id}. " + " ".join(
+            rng.choice(["paper", "sales", "report", "branch", "morale", "client",
+                        "Scranton", "quarterly", "meeting", "party"]) for _ in range(12)),
+        "status": {"status": rng.choice(["open", "in progress", "review", "completed"])},
+        "priority": {"color": "#6fddff", "id": "3", "orderindex": "3", "priority": "normal"},
+        "date_created": str(now_ms - rng.randint(1, 60) * 86400000),
+        "date_done": None,
+        "date_closed": None,
+        "due_date": str(due),
+        "start_date": None,
+        "time_estimate": rng.choice([None, 1800000, 3600000]),
+        "tags": [{"name": rng.choice(["kr-1-1-themed-days", "kr-2-1-cold-calls", "okr-3-personal-growth"])}],
+        "list": {"id": list_id},
+    }
+
+
+class StubClickUpState:
+    """
+    `spaces` optionally groups the lists for the space/folder endpoints:
+    {space_id: {"lists": [list_id, ...], "folders": {folder_id: [list_id, ...]}}}.
+    """
+
+    def __init__(self, list_sizes: Dict[str, int], latency: float = 0.0,
+                 jitter: float = 0.0, rate_per_minute: Optional[int] = None,
+                 spaces: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_per_minute = rate_per_minute
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.rate_limited = 0
+        self.window_start = time.time()
+        self.window_count = 0
+
+        now_ms = int(time.time() * 1000)
+        self.lists: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for list_id, size in list_sizes.items():
+            self.lists[list_id] = {t["id"]: t for t in
+                                   (make_stub_task(list_id, n, now_ms) for n in range(size))}
+        self.spaces = spaces or {}
+
+    def folder_lists(self, folder_id: str) -> Optional[List[str]]:
+        for space in self.spaces.values():
+            if folder_id in space.get("folders", {}):
+                return space["folders"][folder_id]
+        return None
+
+    def find_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        for tasks in self.lists.values():
+            if task_id in tasks:
+                return tasks[task_id]
+        return None
+
+    def admit(self) -> Optional[float]:
+        """Return None to serve the request, or the reset time if rate limited."""
+        if not self.rate_per_minute:
+            return None
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= 60:
+                self.window_start = now
+                self.window_count = 0
+            if self.window_count >= self.rate_per_minute:
+                self.rate_limited += 1
+                return self.window_start + 60
+            self.window_count += 1
+            return None
+
+
+class StubClickUpHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    page_size = 100
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Any, extra_headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _route(self, method: str):
+        state: StubClickUpState = self.server.state
+        url = urlparse(self.path)
+        path = re.sub(r"^/api/v2", "", url.path)
+        query = parse_qs(url.query)
+        body = self._body() if method in ("POST", "PUT") else {}
+
+        reset = state.admit()
+        if reset is not None:
+            self._send(429, {"err": "Rate limit reached", "ECODE": "APP_002"},
+                       {"X-RateLimit-Reset": str(int(reset))})
+            return
+
+        if state.latency or state.jitter:
+            time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+
+        endpoint = path
+        for pattern, name in ((r"^/list/[^/]+/task$", "/list/{id}/task"),
+                              (r"^/team/[^/]+/task$", "/team/{id}/task"),
+                              (r"^/team/[^/]+/space$", "/team/{id}/space"),
+                              (r"^/space/[^/]+/list$", "/space/{id}/list"),
+                              (r"^/space/[^/]+/folder$", "/space/{id}/folder"),
+                              (r"^/folder/[^/]+/list$", "/folder/{id}/list"),
+                              (r"^/task/[^/]+/comment$", "/task/{id}/comment"),
+                              (r"^/task/[^/]+/tag/[^/]+$", "/task/{id}/tag/{tag}"),
+                              (r"^/task/[^/]+$", "/task/{id}")):
+            if re.match(pattern, path):
+                endpoint = name
+                break
+        with state.lock:
+            state.calls[f"{method} {endpoint}"] += 1
+
+        parts = path.strip("/").split("/")
+        if parts[0] in ("list", "team") and len(parts) == 3 and parts[2] == "task" and method == "GET":
+            if parts[0] == "list":
+                tasks = list(state.lists.get(parts[1], {}).values())
+            else:
+                tasks = [t for tasks in state.lists.values() for t in tasks.values()]
+            tags = set(query.get("tags[]", []))
+            if tags:
+                tasks = [t for t in tasks if tags & {x["name"] for x in t["tags"]}]
+            page = int(query.get("page", ["0"])[0])
+            chunk = tasks[page * self.page_size:(page + 1) * self.page_size]
+            self._send(200, {"tasks": chunk, "last_page": (page + 1) * self.page_size >= len(tasks)})
+        elif parts[0] == "team" and len(parts) == 3 and parts[2] == "space" and method == "GET":
+            self._send(200, {"spaces": [{"id": sid, "name": sid} for sid in state.spaces]})
+        elif parts[0] == "space" and len(parts) == 3 and parts[1] in state.spaces:
+            space = state.spaces[parts[1]]
+            if parts[2] == "list":
+                self._send(200, {"lists": [{"id": l, "name": l} for l in space.get("lists", [])]})
+            else:
+                self._send(200, {"folders": [{"id": f, "name": f, "lists": [{"id": l, "name": l} for l in lists]}
+                                             for f, lists in space.get("folders", {}).items()]})
+        elif parts[0] == "folder" and len(parts) == 3 and state.folder_lists(parts[1]) is not None:
+            self._send(200, {"lists": [{"id": l, "name": l} for l in state.folder_lists(parts[1])]})
+        elif parts[0] == "list" and len(parts) == 3 and method == "POST":
+            task = make_stub_task(parts[1], len(state.lists.setdefault(parts[1], {})), int(time.time() * 1000))
+            task["id"] = uuid.uuid4().hex[:9]
+            task["name"] = body.get("name", task["name"])
+            task["description"] = body.get("description", task["description"])
+            task["status"] = {"status": "open"}
+            with state.lock:
+                state.lists[parts[1]][task["id"]] = task
+            self._send(200, task)
+        elif parts[0] == "task" and len(parts) == 2:
+            task = state.find_task(parts[1])
+            if task is None:
+                self._send(404, {"err": "Task not found", "ECODE": "ITEM_013"})
+                return
+            if method == "PUT":
+                with state.lock:
+                    for key in ("name", "description", "due_date", "start_date", "time_estimate"):
+                        if key in body:
+                            task[key] = body[key]
+                    if "status" in body:
+                        task["status"] = {"status": body["status"]}
+            self._send(200, task)
+        elif parts[0] == "task" and len(parts) >= 3 and method == "POST":
+            self._send(200, {"id": uuid.uuid4().hex[:9]})
+        else:
+            self._send(404, {"err": f"Stub does not implement {method} {path}"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+
+class StubClickUp:
+    """Run a StubClickUpHandler server on a background thread."""
+
+    def __init__(self, state: StubClickUpState, host: str = "127.0.0.1", port: int = 0):
+        self.state = state
+        self.server = ThreadingHTTPServer((host, port), StubClickUpHandler)
+        self.server.daemon_threads = True
+        self.server.state = state
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/v2"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+################################################################################
+## Fake model client
+
+def estimate_tokens(obj: Any) -> int:
+    ## Roughly four characters per token, which is close enough for comparisons
+    return max(1, len(json.dumps(obj, default=str)) // 4)
+
+
+class FakeMessages:
+    def __init__(self, owner: "FakeMessagesClient"):
+        self.owner = owner
+
+    def create(self, model: str, max_tokens: int, messages: List[Dict[str, Any]], tools=None, **kwargs):
+        return self.owner.create(model, max_tokens, messages, tools)
+
+
+class FakeMessagesClient:
+    """
+    Stand-in for Anthropic/AnthropicBedrock that follows a script.
+
+    The script for the current turn is looked up by the text of the latest
+    user message; the step within it is the number of assistant messages
+    since then. Calls are stateless, so many sessions can share one client.
+    A response longer than max_tokens stops with stop_reason "max_tokens".
+    """
+
+    def __init__(self, scripts: Dict[str, Dict[str, Any]], latency: float = 0.0):
+        from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+        self._types = (Message, TextBlock, ToolUseBlock, Usage)
+        self.scripts = scripts
+        self.latency = latency
+        self.messages = FakeMessages(self)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.calls = Counter()
+
+    def usage(self) -> Dict[str, int]:
+        """Tokens recorded on the calling thread since the last reset_usage()."""
+        return dict(getattr(self.local, "usage", {"input_tokens": 0, "output_tokens": 0, "calls": 0}))
+
+    def reset_usage(self):
+        self.local.usage = {"input_tokens": 0, "output_tokens": 0, "calls": 0}
+
+    def create(self, model, max_tokens, messages, tools=None):
+        Message, TextBlock, ToolUseBlock, Usage = self._types
+
+        user_index = max(i for i, m in enumerate(messages)
+                         if m["role"] == "user" and isinstance(m["content"], str))
+        step = sum(1 for m in messages[user_index:] if m["role"] == "assistant")
+        script = self.scripts.get(messages[user_index]["content"], {})
+        tool_calls = script.get("tool_calls", DEFAULT_TOOL_CALLS)
+
+        if step < len(tool_calls):
+            content = [ToolUseBlock(type="tool_use", id=f"toolu_{uuid.uuid4().hex[:20]}",
+                                    name=call["name"], input=call.get("input", {}))
+                       for call in tool_calls[step]]
+            stop_reason = "tool_use"
+        else:
+            content = [TextBlock(type="text", text=script.get("reply", "Done."))]
+            stop_reason = "end_turn"
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        output_tokens = estimate_tokens([block_to_dict(c) for c in content])
+        if output_tokens > max_tokens:
+            output_tokens = max_tokens
+            stop_reason = "max_tokens"
+        usage = Usage(input_tokens=estimate_tokens(messages) + (estimate_tokens(tools) if tools else 0),
+                      output_tokens=output_tokens)
+        if not hasattr(self.local, "usage"):
+            self.reset_usage()
+        self.local.usage["input_tokens"] += usage.input_tokens
+        self.local.usage["output_tokens"] += usage.output_tokens
+        self.local.usage["calls"] += 1
+        with self.lock:
+            self.calls[model] += 1
+
+        return Message(id=f"msg_{uuid.uuid4().hex[:20]}", type="message", role="assistant",
+                       model=model, content=content, stop_reason=stop_reason,
+                       stop_sequence=None, usage=usage)
+
+
+################################################################################
+## Replay
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    records = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def group_conversations(records: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    conversations = defaultdict(list)
+    for i, record in enumerate(records):
+        conversations[record.get("session") or record.get("request_id") or str(i)].append(record)
+    return list(conversations.values())
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def write_bench_secrets(directory: str) -> str:
+    path = os.path.join(directory, "bench-secrets.json")
+    with open(path, "w") as f:
+        json.dump({
+            "CLICKUP_API_KEY": "bench-token",
+            "CLICKUP_TEAM_ID": BENCH_TEAM_ID,
+            "CLICKUP_LIST_DEMO_NAME": BENCH_LIST_NAME,
+            "CLICKUP_LIST_DEMO": BENCH_LIST_ID,
+            "WORKFLOWY_API_KEY": "unused",
+        }, f)
+    return path
+
+
+def bench_workspace(lists: int, list_size: int):
+    """
+    List sizes and space layout for `lists` lists of `list_size` tasks: the
+    first half (including BENCH_LIST_ID) sit directly in BENCH_SPACE_ID, the
+    rest in BENCH_FOLDER_ID inside it.
+    """
+    list_ids = [BENCH_LIST_ID] + [f"{BENCH_LIST_ID}-{i}" for i in range(1, lists)]
+    half = (len(list_ids) + 1) // 2
+    spaces = {BENCH_SPACE_ID: {"lists": list_ids[:half], "folders": {BENCH_FOLDER_ID: list_ids[half:]}}}
+    return {list_id: list_size for list_id in list_ids}, spaces
+
+
+def run_benchmark(records: List[Dict[str, Any]], list_size: int = 200, latency: float = 0.0,
+                  jitter: float = 0.0, rate_per_minute: Optional[int] = None,
+                  model_latency: float = 0.0, concurrency: int = 1, repeat: int = 1,
+                  verbose: bool = False, fast_model: Optional[str] = None,
+                  lists: int = 1) -> Dict[str, Any]:
+    """
+    Replay `records` against a stub ClickUp server and a fake model client and
+    return the measured statistics.
+    """
+    list_sizes, spaces = bench_workspace(lists, list_size)
+    state = StubClickUpState(list_sizes, latency, jitter, rate_per_minute, spaces)
+    with StubClickUp(state) as stub, tempfile.TemporaryDirectory() as tmp:
+        ## sbct reads its configuration at import time, so set it up first
+        os.environ["SBCT_SECRETS_FILE"] = write_bench_secrets(tmp)
+        os.environ["DTYPE"] = "demo"
+        os.environ["CLICKUP_API_BASE"] = stub.base_url
+        if not rate_per_minute:
+            os.environ.setdefault("CLICKUP_RATE_PER_MINUTE", "1000000")
+        if fast_model:
+            os.environ["SBCT_FAST_MODEL"] = fast_model
+        else:
+            os.environ.pop("SBCT_FAST_MODEL", None)
+
+        from rich.console import Console
+        import clickup_http
+        import sbct
+
+        clickup_http.CLICKUP_API_BASE = stub.base_url
+        scripts = {r["body"]: r for r in records}
+        fake = FakeMessagesClient(scripts, model_latency)
+        sbct.client = fake
+        sbct.routing = policy_from_env(sbct.MODEL_NAME)
+        ## get_all_tasks without a scope reads the bench list
+        sbct.ALL_TASKS_SPACE, sbct.ALL_TASKS_FOLDER, sbct.ALL_TASKS_LIST = BENCH_SPACE_ID, None, BENCH_LIST_ID
+        sbct._all_tasks_list_id = None
+        sbct.console = Console(quiet=not verbose)
+
+        ## A context variable rather than a thread local, so requests fanned out
+        ## to worker threads (which run in a copy of the turn's context) count too
+        api_calls: contextvars.ContextVar[List[int]] = contextvars.ContextVar("bench_api_calls")
+
+        def count_call(response, *args, **kwargs):
+            counter = api_calls.get(None)
+            if counter is not None:
+                counter[0] += 1
+        clickup_http.session.hooks["response"].append(count_call)
+
+        turns = []
+        turns_lock = threading.Lock()
+
+        def replay(conversation):
+            history = []
+            result_tracker = sbct.ToolResultTracker()
+            for record in conversation:
+                fake.reset_usage()
+                counter = [0]
+                api_calls.set(counter)
+                start = time.perf_counter()
+                error = None
+                turn_start, tracker_state = len(history), result_tracker.snapshot()
+                try:
+                    _, history = sbct.chatbot_interaction(record["body"], history,
+                                                          result_tracker=result_tracker)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    ## Roll back like the server does, so later turns replay a consistent session
+                    del history[turn_start:]
+                    result_tracker.restore(tracker_state)
+                elapsed = time.perf_counter() - start
+                usage = fake.usage()
+                with turns_lock:
+                    turns.append({"request_id": record.get("request_id"), "latency": elapsed,
+                                  "api_calls": counter[0], "model_calls": usage["calls"],
+                                  "input_tokens": usage["input_tokens"],
+                                  "output_tokens": usage["output_tokens"], "error": error})
+
+        conversations = group_conversations(records) * repeat
+        tracemalloc.start()
+        wall_start = time.perf_counter()
+        quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(replay, conversations))
+        wall = time.perf_counter() - wall_start
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        clickup_http.session.hooks["response"].remove(count_call)
+
+    latencies = [t["latency"] for t in turns]
+    tokens = [t["input_tokens"] + t["output_tokens"] for t in turns]
+    return {
+        "turns": len(turns),
+        "errors": [t for t in turns if t["error"]],
+        "wall_seconds": wall,
+        "turns_per_second": len(turns) / wall if wall else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "api_calls_per_turn": statistics.mean([t["api_calls"] for t in turns]) if turns else 0.0,
+        "model_calls_per_turn": statistics.mean([t["model_calls"] for t in turns]) if turns else 0.0,
+        "tokens_per_turn": statistics.mean(tokens) if turns else 0.0,
+        "tokens_per_turn_p95": percentile(tokens, 95),
+        "stub_calls": dict(state.calls),
+        "models": sbct.routing.stats(),
+        "stub_rate_limited": state.rate_limited,
+        "peak_traced_mb": peak_traced / 2 ** 20,
+        "peak_rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                        if resource else None),
+        "per_turn": turns,
+    }
+
+
+def print_report(results: Dict[str, Any]):
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="Replay benchmark", show_header=True, header_style="bold magenta")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value", style="green", justify="right")
+    table.add_row("Turns", str(results["turns"]))
+    table.add_row("Errors", str(len(results["errors"])))
+    table.add_row("Turns / second", f"{results['turns_per_second']:.2f}")
+    for pct in ("p50", "p95", "p99"):
+        table.add_row(f"Turn latency {pct}", f"{results['latency_' + pct] * 1000:.1f} ms")
+    table.add_row("ClickUp calls / turn", f"{results['api_calls_per_turn']:.2f}")
+    table.add_row("Model calls / turn", f"{results['model_calls_per_turn']:.2f}")
+    table.add_row("Tokens / turn (mean)", f"{results['tokens_per_turn']:.0f}")
+    table.add_row("Tokens / turn (p95)", f"{results['tokens_per_turn_p95']:.0f}")
+    table.add_row("Stub 429 responses", str(results["stub_rate_limited"]))
+    table.add_row("Peak traced memory", f"{results['peak_traced_mb']:.1f} MB")
+    if results["peak_rss_mb"] is not None:
+        table.add_row("Peak RSS", f"{results['peak_rss_mb']:.1f} MB")
+    for endpoint, n in sorted(results["stub_calls"].items()):
+        table.add_row(f"  {endpoint}", str(n))
+    for tier, stats in results["models"].items():
+        table.add_row(f"Model {tier}", f"{stats['calls']} calls, {stats['fallbacks']} fell back, "
+                                       f"{stats['mean_latency_ms']:.1f} ms, ${stats['cost_usd']:.4f}")
+    Console().print(table)
+    for e in results["errors"][:5]:
+        Console().print(f"[bold red]{e['request_id']}: {e['error']}[/bold red]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded conversations against stub ClickUp and model endpoints")
+    parser.add_argument("records", help="JSONL file in the requests.jsonl format")
+    parser.add_argument("--list-size", type=int, default=200, help="Tasks in each stub list")
+    parser.add_argument("--lists", type=int, default=1, help="Stub lists, split between bench-space and bench-folder")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Stub ClickUp latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on the stub latency")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Stub requests per minute before 429s")
+    parser.add_argument("--model-latency-ms", type=float, default=0.0, help="Fake model latency per call")
+    parser.add_argument("--concurrency", type=int, default=1, help="Conversations replayed in parallel")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay every conversation this many times")
+    parser.add_argument("--fast-model", help="Route tool continuations to this model (SBCT_FAST_MODEL)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show agent output while replaying")
+    args = parser.parse_args()
+
+    results = run_benchmark(load_records(args.records), args.list_size, args.latency_ms / 1000,
+                            args.jitter_ms / 1000, args.rate_limit, args.model_latency_ms / 1000,
+                            args.concurrency, args.repeat, args.verbose, args.fast_model, args.lists)
+    if args.json:
+        print(json.dumps({k: v for k, v in results.items() if k != "per_turn"}, indent=2, default=str))
+    else:
+        print_report(results)
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
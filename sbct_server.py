@@ -0,0 +1,342 @@
+"""
+Headless multi-session server for the task management agent.
+
+Each session keeps its own conversation_history, while the ClickUp connection
+pool, rate limiter and OKR cache are shared by everything in the process.
+Turns run on a bounded worker pool; once the pool and its queue are full new
+turns are rejected with 503 and a Retry-After header instead of piling up.
+A session is only created once its first turn is admitted, and sessions idle
+for longer than --session-idle-timeout (or the least recently used ones past
+--max-sessions) are closed.
+
+    POST   /sessions/<name>/messages   {"message": "..."}  -> new messages
+    GET    /sessions                                       -> session summary
+    DELETE /sessions/<name>                                -> close a session
+    GET    /health                                         -> pool statistics
+
+Run with e.g. `python sbct_server.py --port 8765` or `--unix /tmp/sbct.sock`.
+CLICKUP_API_BASE, SBCT_SECRETS_FILE and --model-base-url allow driving the
+server against stubbed ClickUp and model endpoints.
+"""
+import argparse
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from rich.console import Console
+
+import sbct
+from session_journal import message_to_dict, open_session
+
+
+class Overloaded(Exception):
+    pass
+
+
+class SessionClosed(Exception):
+    pass
+
+
+class ChatSession:
+    def __init__(self, name: str, persist: bool):
+        self.name = name
+        self.history = open_session(name) if persist else []
+        self.result_tracker = sbct.ToolResultTracker()
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+        self.turns = 0
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        if hasattr(self.history, "journal"):
+            self.history.journal.close()
+
+
+class SessionRegistry:
+    def __init__(self, persist: bool = False, idle_timeout: float = 1800.0,
+                 max_sessions: int = 1000):
+        self.persist = persist
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions: Dict[str, ChatSession] = {}
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, name: str) -> ChatSession:
+        with self.lock:
+            session = self.sessions.get(name)
+            if session is None:
+                self._evict()
+                if len(self.sessions) >= self.max_sessions:
+                    raise Overloaded()
+                session = ChatSession(name, self.persist)
+                self.sessions[name] = session
+            session.last_used = time.time()
+            return session
+
+    def _evict(self):
+        """
+        Close sessions idle for longer than idle_timeout, then the least
+        recently used ones until there is room for one more. Sessions with a
+        turn in progress are never evicted. Called with self.lock held.
+        """
+        now = time.time()
+        by_age = sorted(self.sessions.values(), key=lambda s: s.last_used)
+        for session in by_age:
+            if (now - session.last_used < self.idle_timeout
+                    and len(self.sessions) < self.max_sessions):
+                break
+            if not session.lock.acquire(blocking=False):
+                continue
+            try:
+                session.close()
+            finally:
+                session.lock.release()
+            del self.sessions[session.name]
+            self.evicted += 1
+
+    def close(self, name: str) -> bool:
+        with self.lock:
+            session = self.sessions.pop(name, None)
+        if session is None:
+            return False
+        with session.lock:
+            session.close()
+        return True
+
+    def summary(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return [{"name": s.name, "messages": len(s.history), "turns": s.turns,
+                 "last_used": s.last_used} for s in sessions]
+
+
+class TurnExecutor:
+    """
+    Bounded worker pool for agent turns. At most `workers` turns run at once
+    and at most `max_queue` more may wait; anything beyond that is rejected.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sbct-turn")
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.stats_lock:
+                self.rejected += 1
+            raise Overloaded()
+        with self.stats_lock:
+            self.in_flight += 1
+        try:
+            return self.pool.submit(fn, *args).result()
+        finally:
+            with self.stats_lock:
+                self.in_flight -= 1
+                self.completed += 1
+            self.slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self.stats_lock:
+            return {"workers": self.workers, "max_queue": self.max_queue,
+                    "in_flight": self.in_flight, "completed": self.completed,
+                    "rejected": self.rejected}
+
+
+def run_turn(session: ChatSession, message: str) -> List[Dict[str, Any]]:
+    with session.lock:
+        if session.closed:
+            raise SessionClosed(session.name)
+        start = len(session.history)
+        tracker_state = session.result_tracker.snapshot()
+        try:
+            _, session.history = sbct.chatbot_interaction(message, session.history,
+                                                          result_tracker=session.result_tracker)
+        except Exception as e:
+            ## Drop the half-finished turn so the session stays usable, and
+            ## forget the tool results the model will now never see
+            if hasattr(session.history, "truncate"):
+                session.history.truncate(start, f"turn failed: {type(e).__name__}: {e}")
+            else:
+                del session.history[start:]
+            session.result_tracker.restore(tracker_state)
+            raise
+        session.turns += 1
+        session.last_used = time.time()
+        return [message_to_dict(m) for m in session.history[start:]]
+
+
+def run_session_turn(registry: SessionRegistry, name: str, message: str) -> List[Dict[str, Any]]:
+    """Look the session up (creating it if needed) only once the turn has been admitted."""
+    while True:
+        ## The session may be evicted or deleted between get() and the turn
+        ## taking its lock; it is then simply opened again
+        try:
+            return run_turn(registry.get(name), message)
+        except SessionClosed:
+            continue
+
+
+SESSION_MESSAGES = re.compile(r"^/sessions/([A-Za-z0-9_.-]+)/messages$")
+SESSION = re.compile(r"^/sessions/([A-Za-z0-9_.-]+)$")
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, body: Any, extra_headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", **self.server.executor.stats(),
+                                  "sessions": len(self.server.registry.sessions),
+                                  "evicted_sessions": self.server.registry.evicted,
+                                  "models": sbct.routing.stats()})
+        elif self.path == "/sessions":
+            self._send_json(200, self.server.registry.summary())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        match = SESSION_MESSAGES.match(self.path)
+        if not match:
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            message = json.loads(self.rfile.read(length))["message"]
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": "expected a JSON body with a 'message' field"})
+            return
+
+        name = match.group(1)
+        try:
+            messages = self.server.executor.run(run_session_turn, self.server.registry, name, message)
+        except Overloaded:
+            self._send_json(503, {"error": "server busy"}, {"Retry-After": "1"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"session": name, "messages": messages})
+
+    def do_DELETE(self):
+        match = SESSION.match(self.path)
+        if not match:
+            self._send_json(404, {"error": "not found"})
+            return
+        closed = self.server.registry.close(match.group(1))
+        self._send_json(200 if closed else 404, {"closed": closed})
+
+    def address_string(self):
+        ## Unix socket peers have no (host, port) address
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _ServerMixin:
+    def setup_chat(self, registry: SessionRegistry, executor: TurnExecutor, verbose: bool):
+        self.registry = registry
+        self.executor = executor
+        self.verbose = verbose
+
+
+class ChatHTTPServer(_ServerMixin, ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class ChatUnixServer(_ServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None,
+                workers: int = 8, max_queue: int = 32, persist: bool = False,
+                verbose: bool = False, model_client=None, idle_timeout: float = 1800.0,
+                max_sessions: int = 1000):
+    """
+    Build (but do not start) a server. `model_client` replaces the module level
+    messages client, e.g. with a fake for load testing.
+    """
+    if model_client is not None:
+        sbct.client = model_client
+    ## Agent output goes back over the wire; keep the terminal quiet by default
+    sbct.console = Console(quiet=not verbose)
+    sbct.start_outbox()
+
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = ChatUnixServer(unix_path, ChatRequestHandler)
+    else:
+        server = ChatHTTPServer((host, port), ChatRequestHandler)
+    server.setup_chat(SessionRegistry(persist, idle_timeout, max_sessions),
+                      TurnExecutor(workers, max_queue), verbose)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the task management agent to many concurrent sessions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=8, help="Turns that may run concurrently")
+    parser.add_argument("--max-queue", type=int, default=32, help="Turns that may wait for a worker before requests are rejected")
+    parser.add_argument("--persist", action="store_true", help="Journal each session to SBCT_SESSION_DIR")
+    parser.add_argument("--session-idle-timeout", type=float, default=1800.0,
+                        help="Close sessions that have been idle for this many seconds")
+    parser.add_argument("--max-sessions", type=int, default=1000,
+                        help="Open sessions kept before the least recently used idle ones are closed")
+    parser.add_argument("--model-base-url", help="Send model requests to this Anthropic-compatible endpoint")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    model_client = None
+    if args.model_base_url:
+        from anthropic import Anthropic
+        model_client = Anthropic(base_url=args.model_base_url,
+                                 api_key=os.environ.get("ANTHROPIC_API_KEY", "stub"))
+
+    server = make_server(args.host, args.port, args.unix, args.workers, args.max_queue,
+                         args.persist, args.verbose, model_client,
+                         args.session_idle_timeout, args.max_sessions)
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"Serving on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for name in [s["name"] for s in server.registry.summary()]:
+            server.registry.close(name)
+        sbct.stop_outbox()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import base64
 import json
+import os
 
 import boto3
 import botocore
@@ -13,6 +14,13 @@ def get_secret(secret_name=None, region_name="us-east-1"):
             "DEPRECATION_WARNING: Calling get_secret with no secret_name currently defaults to prod/sjbClickUp.  Will eventually default to None and raise error"
         )
 
+    # A local JSON file can stand in for Secrets Manager, e.g. when running
+    # against stubbed ClickUp and model endpoints without AWS access.
+    secrets_file = os.environ.get("SBCT_SECRETS_FILE")
+    if secrets_file:
+        with open(secrets_file, "r") as f:
+            return json.load(f)
+
     # Create a Secrets Manager client
     session = boto3.session.Session()
     client = session.client(service_name="secretsmanager", region_name=region_name)
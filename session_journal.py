@@ -0,0 +1,308 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pytz
+
+## Sessions live as one append-only JSONL file per name under this directory.
+## The first line is a header, every following line is one conversation message
+## or a rollback record that discards the messages after a given count.
+SESSION_DIR = os.environ.get("SBCT_SESSION_DIR", "sessions")
+
+## Journals are rewritten in the background once dead lines (rolled back,
+## duplicate or corrupt) reach this fraction of the live messages, and at
+## least COMPACT_MIN_DEAD of them; on open any dead line is enough.
+COMPACT_DEAD_RATIO = 0.5
+COMPACT_MIN_DEAD = 16
+
+
+def block_to_dict(block: Any) -> Any:
+    """
+    Convert an SDK content block (TextBlock, ToolUseBlock, ...) into the plain
+    dict form the messages API accepts, so it survives a JSON round trip.
+    """
+    if isinstance(block, (dict, str)):
+        return block
+    if hasattr(block, "model_dump"):
+        return block.model_dump(exclude_none=True)
+    return block.dict(exclude_none=True)
+
+
+def message_to_dict(message: Dict[str, Any]) -> Dict[str, Any]:
+    content = message["content"]
+    if not isinstance(content, str):
+        content = [block_to_dict(b) for b in content]
+    return {"role": message["role"], "content": content}
+
+
+def ends_turn(message: Dict[str, Any]) -> bool:
+    """
+    True when a conversation can validly stop after `message`: an assistant
+    reply that is not waiting for any tool results.
+    """
+    if message["role"] != "assistant":
+        return False
+    content = message["content"]
+    if isinstance(content, str):
+        return True
+    return not any(block_to_dict(b).get("type") == "tool_use" for b in content)
+
+
+def complete_length(messages: List[Dict[str, Any]]) -> int:
+    """Length of the longest prefix of `messages` that ends on a complete turn."""
+    for i in range(len(messages) - 1, -1, -1):
+        if ends_turn(messages[i]):
+            return i + 1
+    return 0
+
+
+class SessionJournal:
+    """
+    Append-only JSONL journal for a single named session.
+
+    Each message is written and flushed as soon as it is appended. fsync is
+    batched: it happens every `fsync_every` messages or once `fsync_interval`
+    seconds have passed since the last one, and always on close(). The
+    journal keeps a count of live and dead lines and compacts itself in the
+    background when too many are dead.
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None,
+                 fsync_every: int = 8, fsync_interval: float = 1.0):
+        self.name = name
+        self.directory = directory or SESSION_DIR
+        self.path = os.path.join(self.directory, f"{name}.jsonl")
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+        self._compactor: Optional[threading.Thread] = None
+        self.corrupt_lines = 0
+        self.live = 0
+        self.dead = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        header = self.read_header(self.path)
+        if header is None:
+            self.session_id = str(uuid.uuid4())
+            self._seq = 0
+            self._file = open(self.path, "w")
+            self._write_line({
+                "type": "session",
+                "session_id": self.session_id,
+                "name": name,
+                "created": datetime.now(pytz.timezone('US/Pacific')).isoformat(),
+            })
+            self._sync()
+        else:
+            self.session_id = header["session_id"]
+            records, read, self._seq = self._replay()
+            self.live = len(records)
+            self.dead = read - self.live + self.corrupt_lines
+            self._file = open(self.path, "a")
+            ## A crash can leave a torn last line; start appends on a fresh line
+            if self._ends_without_newline():
+                self._file.write("\n")
+                self.dead += 1
+            if self.dead:
+                self.compact_in_background()
+
+    @staticmethod
+    def read_header(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r") as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        if header.get("type") != "session":
+            return None
+        return header
+
+    def _ends_without_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def _iter_records(self, rollbacks: bool = False) -> Iterator[Dict[str, Any]]:
+        self.corrupt_lines = 0
+        with open(self.path, "r") as f:
+            f.readline()  # header
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.corrupt_lines += 1
+                    continue
+                if record.get("type") == "message" or (rollbacks and record.get("type") == "rollback"):
+                    yield record
+
+    def _write_line(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def append(self, message: Dict[str, Any]):
+        with self._lock:
+            self._seq += 1
+            self._write_line({"type": "message", "seq": self._seq,
+                              "message": message_to_dict(message)})
+            self.live += 1
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_fsync >= self.fsync_interval):
+                self._sync()
+
+    def rollback(self, length: int, reason: str = ""):
+        """Discard every message after the first `length`, e.g. those of a failed turn."""
+        with self._lock:
+            self._write_line({"type": "rollback", "length": length, "reason": reason})
+            self._sync()
+            self.dead += max(0, self.live - length) + 1
+            self.live = min(self.live, length)
+            needs_compaction = self.dead >= max(COMPACT_MIN_DEAD, COMPACT_DEAD_RATIO * self.live)
+        if needs_compaction:
+            self.compact_in_background()
+
+    def _replay(self) -> Tuple[List[Dict[str, Any]], int, int]:
+        """
+        Message records in order with rollbacks applied, plus the number of
+        records read and the highest sequence number seen (rolled back ones
+        included, so new messages never reuse a number). Corrupt lines are
+        skipped and duplicate sequence numbers keep the first copy.
+        """
+        seen = set()
+        records: List[Dict[str, Any]] = []
+        read = 0
+        last_seq = 0
+        for record in self._iter_records(rollbacks=True):
+            read += 1
+            if record["type"] == "rollback":
+                del records[record["length"]:]
+                continue
+            last_seq = max(last_seq, record["seq"])
+            if record["seq"] in seen:
+                continue
+            seen.add(record["seq"])
+            records.append(record)
+        return records, read, last_seq
+
+    def _live_records(self) -> List[Dict[str, Any]]:
+        return self._replay()[0]
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            self._file.flush()
+        for record in self._live_records():
+            yield record["message"]
+
+    def compact(self):
+        """
+        Rewrite the journal without corrupt, duplicate or rolled back lines.
+        The new file is written next to the old one and swapped in atomically.
+        """
+        with self._lock:
+            self._file.flush()
+            tmp_path = self.path + ".compact"
+            header = self.read_header(self.path)
+            records = self._live_records()
+            with open(tmp_path, "w") as out:
+                out.write(json.dumps(header) + "\n")
+                for record in records:
+                    out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a")
+            self.corrupt_lines = 0
+            self.live = len(records)
+            self.dead = 0
+
+    def compact_in_background(self) -> threading.Thread:
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self.compact, daemon=True)
+            self._compactor.start()
+        return self._compactor
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._sync()
+                self._file.close()
+
+
+class JournaledHistory(list):
+    """
+    A conversation_history list that writes every appended message to its
+    journal, so chatbot_interaction can use it unchanged.
+    """
+
+    def __init__(self, journal: SessionJournal, messages=()):
+        super().__init__(messages)
+        self.journal = journal
+
+    def append(self, message):
+        super().append(message)
+        self.journal.append(message)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def truncate(self, length: int, reason: str = ""):
+        """Drop every message after the first `length`, in memory and in the journal."""
+        if length < len(self):
+            del self[length:]
+            self.journal.rollback(length, reason)
+
+
+def list_sessions(directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Return the header of every saved session without loading any messages."""
+    directory = directory or SESSION_DIR
+    if not os.path.isdir(directory):
+        return []
+    sessions = []
+    for fname in sorted(os.listdir(directory)):
+        if not fname.endswith(".jsonl"):
+            continue
+        header = SessionJournal.read_header(os.path.join(directory, fname))
+        if header is not None:
+            sessions.append(header)
+    return sessions
+
+
+def open_session(name: str, directory: Optional[str] = None) -> JournaledHistory:
+    """
+    Open (or create) a named session and replay its messages into a history
+    list. A turn that never finished (a dangling user message, or a tool_use
+    without its results after a crash) is rolled back so the history can be
+    sent to the model again, and a journal with any dead lines is compacted
+    in the background.
+
+    The whole history is read up front: every turn sends all of it to the
+    model, so there is nothing to gain from loading it lazily.
+    """
+    journal = SessionJournal(name, directory=directory)
+    history = JournaledHistory(journal, journal.iter_messages())
+    history.truncate(complete_length(history), "incomplete turn")
+    if journal.dead:
+        journal.compact_in_background()
+    return history
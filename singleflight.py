@@ -0,0 +1,62 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Merge concurrent identical calls into one.
+
+    The first caller for a key runs `fn`; anyone asking for the same key while
+    it is in flight waits and receives the same result (or exception). Nothing
+    is cached once the call finishes. Results are shared between callers, so
+    they must be treated as read-only.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self.calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"executed": self.executed, "coalesced": self.coalesced,
+                    "in_flight": len(self.calls)}
@@ -0,0 +1,186 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+## In-memory BM25 index over raw ClickUp task dicts (name, description and
+## tag names), so the agent can find a task by what it is about without
+## reading every task through the context window. Tasks are indexed whenever
+## a tool sees them and re-indexed in place when they change. A `tag_text`
+## function can add searchable text for each tag, e.g. the OKR it refers to.
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "about", "an", "and", "are", "as", "at", "be", "by", "for", "from",
+    "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "with",
+}
+
+## Words in the name count this many times, so a match there outranks the
+## same word somewhere in a long description
+NAME_WEIGHT = 3
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        ## Crude plural folding: "reports" and "report" share a term
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def task_terms(task: Dict[str, Any], tag_text: Optional[Callable[[str], str]] = None) -> Counter:
+    terms = Counter()
+    for token in tokenize(task.get("name") or ""):
+        terms[token] += NAME_WEIGHT
+    terms.update(tokenize(task.get("description") or ""))
+    for tag in task.get("tags") or []:
+        terms.update(tokenize(tag["name"]))
+        if tag_text is not None:
+            terms.update(tokenize(tag_text(tag["name"])))
+    return terms
+
+
+class TaskIndex:
+    """
+    BM25 over task dicts, updated incrementally. search() scores only the
+    postings of the query terms.
+
+    Every indexed task is held by one or more sources: a list query loaded
+    with load(), or the catch-all SEEN for tasks upserted individually. When a
+    source stops returning a task it releases it, and the task leaves the
+    index only once no source holds it any more.
+    """
+
+    SEEN = "seen"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75,
+                 tag_text: Optional[Callable[[str], str]] = None):
+        self.k1 = k1
+        self.b = b
+        self.tag_text = tag_text
+        self.lock = threading.Lock()
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        ## Terms as indexed, so removal matches even if tag_text has changed since
+        self.terms: Dict[str, Counter] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+        ## source -> ids it holds, and id -> number of sources holding it
+        self.sources: Dict[Hashable, Set[str]] = {}
+        self.refs: Dict[str, int] = {}
+        self.loaded: Set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def _remove(self, task_id: str):
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return
+        for term in self.terms.pop(task_id):
+            postings = self.postings[term]
+            del postings[task_id]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(task_id)
+
+    def _add(self, task: Dict[str, Any]):
+        terms = task_terms(task, self.tag_text)
+        self.tasks[task["id"]] = task
+        self.terms[task["id"]] = terms
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[task["id"]] = tf
+        self.lengths[task["id"]] = sum(terms.values())
+        self.total_length += self.lengths[task["id"]]
+
+    def _hold(self, source: Hashable, task_id: str):
+        held = self.sources.setdefault(source, set())
+        if task_id not in held:
+            held.add(task_id)
+            self.refs[task_id] = self.refs.get(task_id, 0) + 1
+
+    def _release(self, source: Hashable, task_id: str):
+        held = self.sources.get(source)
+        if held is None or task_id not in held:
+            return
+        held.discard(task_id)
+        self.refs[task_id] -= 1
+        if not self.refs[task_id]:
+            del self.refs[task_id]
+            self._remove(task_id)
+
+    def upsert(self, tasks: Iterable[Dict[str, Any]], source: Hashable = SEEN):
+        """Index or re-index `tasks`, held by `source`."""
+        with self.lock:
+            for task in tasks:
+                self._hold(source, task["id"])
+                old = self.tasks.get(task["id"])
+                if old is not None and old == task:
+                    continue
+                self._remove(task["id"])
+                self._add(task)
+
+    def remove(self, task_id: str):
+        """Drop a task regardless of its sources, e.g. once it is known to be deleted."""
+        with self.lock:
+            for held in self.sources.values():
+                held.discard(task_id)
+            self.refs.pop(task_id, None)
+            self._remove(task_id)
+
+    def update(self, task_id: str, change: Callable[[Dict[str, Any]], None]) -> bool:
+        """Apply `change` to a copy of an indexed task and re-index it."""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return False
+            task = dict(task)
+            change(task)
+            self._remove(task_id)
+            self._add(task)
+            return True
+
+    def load(self, source: Hashable, tasks: Iterable[Dict[str, Any]]):
+        """
+        Index everything `source` (e.g. one list query) currently returns and
+        release the tasks it held before but no longer returns.
+        """
+        tasks = list(tasks)
+        ids = {t["id"] for t in tasks}
+        self.upsert(tasks, source)
+        with self.lock:
+            for task_id in self.sources.get(source, set()) - ids:
+                self._release(source, task_id)
+            self.loaded.add(source)
+
+    def has_source(self, source: Hashable) -> bool:
+        """Whether `source` has been loaded in full at least once."""
+        with self.lock:
+            return source in self.loaded
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return up to `k` (score, task) pairs, best first."""
+        terms = set(tokenize(query))
+        with self.lock:
+            n = len(self.tasks)
+            if not n or not terms:
+                return []
+            avg_length = self.total_length / n
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for task_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[task_id] / avg_length)
+                    scores[task_id] = scores.get(task_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(score, self.tasks[task_id]) for task_id, score in best]
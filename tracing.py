@@ -0,0 +1,227 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, Optional
+
+## Structured per-turn tracing. Disabled unless SBCT_TRACE_FILE is set, in
+## which case every finished span is appended to that file as one JSON line.
+##
+## SBCT_TRACE_FORMAT  jsonl (default) writes flat span records;
+##                    otlp writes OTLP/JSON ExportTraceServiceRequest lines
+##                    that an OpenTelemetry collector file receiver can read.
+## SBCT_PROFILE       cprofile or pyinstrument captures a profile per turn,
+##                    written next to the trace file and named by trace id.
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, value: float):
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def record_usage(self, usage: Any):
+        """Record token usage from a messages.create response on this span and its turn."""
+        if usage is None:
+            return
+        for span in {self, self.root}:
+            span.add("gen_ai.usage.input_tokens", getattr(usage, "input_tokens", 0) or 0)
+            span.add("gen_ai.usage.output_tokens", getattr(usage, "output_tokens", 0) or 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent is not None else None,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned when tracing is off so call sites never need to check."""
+    attributes: Dict[str, Any] = {}
+    duration_ms = 0.0
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, value):
+        pass
+
+    def record_usage(self, usage):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def span_to_otlp(span: Span) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "sbct"}}]},
+        "scopeSpans": [{
+            "scope": {"name": "sbct.tracing"},
+            "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent.span_id if span.parent is not None else "",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                "status": {"code": 1 if span.status == "ok" else 2},
+            }],
+        }],
+    }]}
+
+
+class Tracer:
+    def __init__(self, path: Optional[str] = None, fmt: str = "jsonl", profile: str = ""):
+        self.path = path
+        self.fmt = fmt
+        self.profile = profile
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("sbct_span", default=None)
+        self._write_lock = threading.Lock()
+        self._file = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def current(self):
+        return self._current.get() or NOOP_SPAN
+
+    def _export(self, span: Span):
+        record = span_to_otlp(span) if self.fmt == "otlp" else span.to_dict()
+        line = json.dumps(record, default=str) + "\n"
+        with self._write_lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(line)
+            self._file.flush()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        parent = self._current.get()
+        trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        span = Span(name, trace_id, parent, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            self._current.reset(token)
+            span.end_ns = time.time_ns()
+            self._export(span)
+
+    @contextlib.contextmanager
+    def accumulate(self, key: str) -> Iterator[None]:
+        """
+        Add the elapsed time of a hot, high-volume step (like converting one
+        task) to the current span as `<key>_ms` / `<key>_count` rather than
+        emitting a span per call.
+        """
+        span = self._current.get()
+        if span is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            span.add(f"{key}_ms", (time.perf_counter() - start) * 1000)
+            span.add(f"{key}_count", 1)
+
+    @contextlib.contextmanager
+    def turn(self, name: str = "chat.turn", **attributes) -> Iterator[Any]:
+        """Root span for one agent turn, with an optional profile of the whole turn."""
+        with self.span(name, **attributes) as span:
+            if not self.enabled or not self.profile:
+                yield span
+                return
+            with self._profiled(span):
+                yield span
+
+    @contextlib.contextmanager
+    def _profiled(self, span: Span) -> Iterator[None]:
+        base = f"{os.path.splitext(self.path)[0]}.{span.trace_id}"
+        if self.profile == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                span.set("profile_error", "pyinstrument is not installed")
+                yield
+                return
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(base + ".html", "w") as f:
+                    f.write(profiler.output_html())
+                span.set("profile", base + ".html")
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            ## Only one cProfile can be active per interpreter; concurrent
+            ## turns in server mode just skip profiling.
+            try:
+                profiler.enable()
+            except ValueError:
+                yield
+                return
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(base + ".prof")
+                span.set("profile", base + ".prof")
+
+
+tracer = Tracer(os.environ.get("SBCT_TRACE_FILE"),
+                os.environ.get("SBCT_TRACE_FORMAT", "jsonl"),
+                os.environ.get("SBCT_PROFILE", ""))